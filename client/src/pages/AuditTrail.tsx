@@ -52,8 +52,10 @@ interface AuditLog {
 interface AuditLogsResponse {
   logs: AuditLog[];
   total: number;
+  totalIsEstimate?: boolean;
   limit: number;
   offset: number;
+  nextCursor?: string | null;
 }
 
 interface AuditStats {
@@ -75,6 +77,7 @@ export default function AuditTrailPage() {
   const [entityTypeFilter, setEntityTypeFilter] = useState<string>("all");
   const [searchQuery, setSearchQuery] = useState("");
   const [page, setPage] = useState(0);
+  const [pageCursors, setPageCursors] = useState<(string | null)[]>([null]);
   const limit = 20;
 
   const buildQueryKey = () => {
@@ -82,7 +85,12 @@ export default function AuditTrailPage() {
     if (actionFilter && actionFilter !== "all") params.set("action", actionFilter);
     if (entityTypeFilter && entityTypeFilter !== "all") params.set("entityType", entityTypeFilter);
     params.set("limit", limit.toString());
-    params.set("offset", (page * limit).toString());
+    const cursor = pageCursors[page];
+    if (page > 0 && cursor) {
+      params.set("cursor", cursor);
+    } else {
+      params.set("offset", (page * limit).toString());
+    }
     return `/api/audit-logs?${params.toString()}`;
   };
 
@@ -326,7 +334,7 @@ export default function AuditTrailPage() {
 
               <div className="flex items-center justify-between mt-4">
                 <p className="text-sm text-muted-foreground">
-                  Showing {page * limit + 1} to {Math.min((page + 1) * limit, logsData?.total || 0)} of {logsData?.total || 0} entries
+                  Showing {page * limit + 1} to {Math.min((page + 1) * limit, logsData?.total || 0)} of {logsData?.totalIsEstimate ? "~" : ""}{logsData?.total || 0} entries
                 </p>
                 <div className="flex items-center gap-2">
                   <Button
@@ -345,7 +353,14 @@ export default function AuditTrailPage() {
                   <Button
                     variant="outline"
                     size="sm"
-                    onClick={() => setPage(p => p + 1)}
+                    onClick={() => {
+                      setPageCursors(cursors => {
+                        const next = [...cursors];
+                        next[page + 1] = logsData?.nextCursor ?? null;
+                        return next;
+                      });
+                      setPage(p => p + 1);
+                    }}
                     disabled={page >= totalPages - 1}
                     data-testid="button-next-page"
                   >
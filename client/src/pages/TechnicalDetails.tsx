@@ -120,7 +120,7 @@ const features = [
 
 const apiEndpoints = [
   { method: "GET", path: "/api/dashboard", description: "Dashboard statistics and metrics" },
-  { method: "GET", path: "/api/verifications", description: "List all verifications" },
+  { method: "GET", path: "/api/verifications", description: "List verifications (cursor-paginated, filterable)" },
   { method: "POST", path: "/api/verifications", description: "Create new verification with document upload" },
   { method: "GET", path: "/api/verifications/:id", description: "Get verification details" },
   { method: "PATCH", path: "/api/verifications/:id", description: "Update verification status (approve/reject)" },
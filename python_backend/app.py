@@ -1,15 +1,17 @@
 import os
+import sys
 import uuid
+import time
+import signal
+import threading
 import json
 import base64
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from openai import OpenAI
-from io import BytesIO
 import random
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
 
@@ -24,15 +26,22 @@ print("DATABASE_URL from env:", DATABASE_URL)
 app = Flask(__name__)
 CORS(app, origins="*")
 
+# Per-document upload limit; the Express proxy enforces the same 10 MB default
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+MAX_BATCH_DOCUMENTS = 50
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Retries are handled by openai_limiter so backoff is coordinated across threads and workers
 client = OpenAI(
-    api_key="sk-1234567890abcdef"
+    api_key="sk-1234567890abcdef",
+    max_retries=0
 )
 
 
 try:
     from rag_service import (
         rag_enhanced_chat,
-        create_document_embedding,
+        embed_verifications_bulk,
         store_fraud_pattern_embeddings,
         semantic_document_search,
         find_similar_verifications,
@@ -40,7 +49,10 @@ try:
         run_verification_workflow,
         analyze_document_with_rag,
         get_knowledge_base_stats,
-        init_langchain
+        init_langchain,
+        RAG_EMBED_CHUNK_SIZE,
+        RAG_EMBED_CONCURRENCY,
+        RAG_EMBED_MAX_CHUNK_SIZE
     )
     RAG_ENABLED = True
     print("[python] RAG service loaded successfully")
@@ -48,102 +60,31 @@ except Exception as e:
     RAG_ENABLED = False
     print(f"[python] RAG service not available: {e}")
 
-DATABASE_URL = os.environ.get("DATABASE_URL")
+from db import get_db_connection, borrow_connection, release_request_connection, yield_request_connection, get_pool_stats
+from migrations import run_migrations
+from audit_writer import enqueue_audit_event, get_audit_writer_stats
+from audit_query import db_row_to_audit_log, build_audit_log_select, query_audit_log_page
+from settings_cache import SettingsCache, SETTINGS_CHANNEL
+from query_embedding_cache import get_query_embedding_cache_stats
+from ocr_cache import ocr_cache, get_ocr_cache_stats
+from image_preprocess import preprocess_document, get_preprocess_stats
+from openai_limiter import openai_limiter, estimate_tokens, get_openai_limiter_stats, get_embedding_limiter_stats
+from ocr_packing import (
+    OCR_RESULT_SCHEMA, plan_packs, image_tokens, build_pack_prompt, pack_output_tokens,
+    parse_pack_response, record_pack, get_ocr_packing_stats
+)
+from stage_metrics import StageMetrics
+from rescore import rescore_pending_verifications, RESCORE_SETTING_KEYS
+from blob_store import put_stream, blob_exists, blob_path, sniff_content_type, document_url_for
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        DATABASE_URL,
-        cursor_factory=RealDictCursor,
-        sslmode="require"
-    )
-    return conn
+app.teardown_appcontext(release_request_connection)
 
 
 def init_db():
-    """Initialize database tables"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS verifications (
-            id TEXT PRIMARY KEY,
-            document_type TEXT,
-            document_url TEXT,
-            status TEXT,
-            risk_score INTEGER,
-            risk_level TEXT,
-            customer_name TEXT,
-            submitted_at TIMESTAMP,
-            reviewed_at TIMESTAMP,
-            ocr_fields JSONB,
-            risk_insights JSONB,
-            validation_results JSONB
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS chat_messages (
-            id TEXT PRIMARY KEY,
-            verification_id TEXT REFERENCES verifications(id),
-            role TEXT,
-            content TEXT,
-            timestamp TIMESTAMP
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            id INTEGER PRIMARY KEY DEFAULT 1,
-            auto_approve_threshold INTEGER DEFAULT 30,
-            high_risk_threshold INTEGER DEFAULT 70,
-            email_notifications BOOLEAN DEFAULT TRUE,
-            in_app_notifications BOOLEAN DEFAULT TRUE,
-            auto_reject_high_risk BOOLEAN DEFAULT FALSE
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS audit_logs (
-            id TEXT PRIMARY KEY,
-            action TEXT NOT NULL,
-            entity_type TEXT NOT NULL,
-            entity_id TEXT,
-            user_id TEXT DEFAULT 'system',
-            user_name TEXT DEFAULT 'System',
-            details JSONB,
-            ip_address TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS batch_jobs (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            total_documents INTEGER DEFAULT 0,
-            processed_documents INTEGER DEFAULT 0,
-            successful_documents INTEGER DEFAULT 0,
-            failed_documents INTEGER DEFAULT 0,
-            verification_ids JSONB DEFAULT '[]',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            started_at TIMESTAMP,
-            completed_at TIMESTAMP,
-            error_message TEXT
-        )
-    """)
-    
-    cur.execute("SELECT COUNT(*) as count FROM settings")
-    if cur.fetchone()["count"] == 0:
-        cur.execute("""
-            INSERT INTO settings (id, auto_approve_threshold, high_risk_threshold, 
-                                  email_notifications, in_app_notifications, auto_reject_high_risk)
-            VALUES (1, 30, 70, TRUE, TRUE, FALSE)
-        """)
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    """Initialize database tables by applying pending schema migrations"""
+    applied = run_migrations()
+    if applied:
+        print(f"[python] Applied migrations: {', '.join(str(v) for v in applied)}")
 
 try:
     init_db()
@@ -151,35 +92,48 @@ try:
 except Exception as e:
     print(f"[python] Database initialization warning: {e}")
 
-def get_settings():
-    """Get settings from database"""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM settings WHERE id = 1")
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        if row:
-            return {
-                "autoApproveThreshold": row["auto_approve_threshold"],
-                "highRiskThreshold": row["high_risk_threshold"],
-                "emailNotifications": row["email_notifications"],
-                "inAppNotifications": row["in_app_notifications"],
-                "autoRejectHighRisk": row["auto_reject_high_risk"]
-            }
-    except:
-        pass
+DEFAULT_SETTINGS = {
+    "autoApproveThreshold": 30,
+    "highRiskThreshold": 70,
+    "emailNotifications": True,
+    "inAppNotifications": True,
+    "autoRejectHighRisk": False
+}
+
+def db_row_to_settings(row):
+    """Convert database row to settings dict"""
     return {
-        "autoApproveThreshold": 30,
-        "highRiskThreshold": 70,
-        "emailNotifications": True,
-        "inAppNotifications": True,
-        "autoRejectHighRisk": False
+        "autoApproveThreshold": row["auto_approve_threshold"],
+        "highRiskThreshold": row["high_risk_threshold"],
+        "emailNotifications": row["email_notifications"],
+        "inAppNotifications": row["in_app_notifications"],
+        "autoRejectHighRisk": row["auto_reject_high_risk"]
     }
 
+def load_settings():
+    """Load settings and their version from database"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM settings WHERE id = 1")
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    if row:
+        return db_row_to_settings(row), row["version"]
+    return dict(DEFAULT_SETTINGS), 0
+
+settings_cache = SettingsCache(load_settings)
+
+def get_settings():
+    """Get settings, served from the in-process cache when it is current"""
+    try:
+        return settings_cache.get()
+    except Exception as e:
+        print(f"Get settings error: {e}")
+    return dict(DEFAULT_SETTINGS)
+
 def save_settings(settings_data):
-    """Save settings to database"""
+    """Save settings to database and notify every process of the new version"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -189,8 +143,10 @@ def save_settings(settings_data):
                 high_risk_threshold = %s,
                 email_notifications = %s,
                 in_app_notifications = %s,
-                auto_reject_high_risk = %s
+                auto_reject_high_risk = %s,
+                version = version + 1
             WHERE id = 1
+            RETURNING *
         """, (
             settings_data.get("autoApproveThreshold", 30),
             settings_data.get("highRiskThreshold", 70),
@@ -198,9 +154,14 @@ def save_settings(settings_data):
             settings_data.get("inAppNotifications", True),
             settings_data.get("autoRejectHighRisk", False)
         ))
+        row = cur.fetchone()
+        if row:
+            cur.execute("SELECT pg_notify(%s, %s)", (SETTINGS_CHANNEL, str(row["version"])))
         conn.commit()
         cur.close()
         conn.close()
+        if row:
+            settings_cache.set(db_row_to_settings(row), row["version"])
     except Exception as e:
         print(f"Settings save error: {e}")
 
@@ -276,10 +237,13 @@ fraud_patterns = [
 
 def db_row_to_verification(row):
     """Convert database row to verification dict"""
+    document_hash = row.get("document_hash")
     return {
         "id": row["id"],
         "documentType": row["document_type"],
-        "documentUrl": row["document_url"] or "",
+        "documentUrl": document_url_for(document_hash) if document_hash else (row["document_url"] or ""),
+        "documentHash": document_hash,
+        "documentMimeType": row.get("document_mime_type"),
         "status": row["status"],
         "riskScore": row["risk_score"],
         "riskLevel": row["risk_level"],
@@ -289,6 +253,7 @@ def db_row_to_verification(row):
         "ocrFields": row["ocr_fields"] or [],
         "riskInsights": row["risk_insights"] or [],
         "validationResults": row["validation_results"] or [],
+        "processingTimings": row.get("processing_timings"),
         "chatHistory": []
     }
 
@@ -306,6 +271,142 @@ def get_all_verifications():
         print(f"Get verifications error: {e}")
         return []
 
+VERIFICATION_FIELD_COLUMNS = {
+    "id": ["id"],
+    "documentType": ["document_type"],
+    "documentUrl": ["document_url", "document_hash"],
+    "documentHash": ["document_hash"],
+    "documentMimeType": ["document_mime_type"],
+    "status": ["status"],
+    "riskScore": ["risk_score"],
+    "riskLevel": ["risk_level"],
+    "customerName": ["customer_name"],
+    "submittedAt": ["submitted_at"],
+    "reviewedAt": ["reviewed_at"],
+    "ocrFields": ["ocr_fields"],
+    "riskInsights": ["risk_insights"],
+    "validationResults": ["validation_results"],
+    "processingTimings": ["processing_timings"]
+}
+
+VERIFICATION_COLUMNS = sorted({c for cols in VERIFICATION_FIELD_COLUMNS.values() for c in cols})
+
+def encode_cursor(submitted_at, ver_id):
+    """Encode a (submitted_at, id) keyset position as an opaque cursor"""
+    payload = json.dumps([submitted_at.isoformat() if submitted_at else None, ver_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """Decode a cursor into (submitted_at, id); raises ValueError if malformed"""
+    try:
+        submitted_at, ver_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(submitted_at) if submitted_at else None), str(ver_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def get_verifications_page(filters=None, limit=50, cursor=None, fields=None):
+    """Get one page of verifications ordered by (submitted_at, id) descending.
+    
+    Uses keyset pagination so deep pages cost the same as the first one, and
+    selects only the columns needed for the requested fields.
+    """
+    fields = [f for f in (fields or VERIFICATION_FIELD_COLUMNS.keys()) if f in VERIFICATION_FIELD_COLUMNS]
+    columns = {"id", "submitted_at"}
+    for field in fields:
+        columns.update(VERIFICATION_FIELD_COLUMNS[field])
+    
+    query = f"SELECT {', '.join(sorted(columns))} FROM verifications WHERE 1=1"
+    params = []
+    
+    if filters:
+        if filters.get("status"):
+            query += " AND status = ANY(%s)"
+            params.append(filters["status"])
+        if filters.get("risk_level"):
+            query += " AND risk_level = ANY(%s)"
+            params.append(filters["risk_level"])
+        if filters.get("document_type"):
+            query += " AND document_type = ANY(%s)"
+            params.append(filters["document_type"])
+    
+    if cursor:
+        cursor_submitted_at, cursor_id = decode_cursor(cursor)
+        if cursor_submitted_at is None:
+            query += " AND ((submitted_at IS NULL AND id < %s) OR submitted_at IS NOT NULL)"
+            params.append(cursor_id)
+        else:
+            query += " AND (submitted_at, id) < (%s, %s)"
+            params.extend([cursor_submitted_at, cursor_id])
+    
+    query += " ORDER BY submitted_at DESC NULLS FIRST, id DESC LIMIT %s"
+    params.append(limit + 1)
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["submitted_at"], rows[-1]["id"])
+    
+    items = []
+    for row in rows:
+        full = db_row_to_verification({**dict.fromkeys(VERIFICATION_COLUMNS), **row})
+        items.append({field: full[field] for field in fields})
+    
+    return {"verifications": items, "nextCursor": next_cursor}
+
+def get_recent_verifications(limit=10):
+    """Get the most recently submitted verifications"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM verifications ORDER BY submitted_at DESC LIMIT %s", (limit,))
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        return [db_row_to_verification(row) for row in rows]
+    except Exception as e:
+        print(f"Get recent verifications error: {e}")
+        return []
+
+def get_dashboard_stats(days=30):
+    """Get dashboard counters and daily volume from the verification rollup table"""
+    stats = {"total": 0, "approved": 0, "rejected": 0, "pending": 0, "high_risk": 0, "daily": {}}
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT
+                COALESCE(SUM(count), 0) AS total,
+                COALESCE(SUM(count) FILTER (WHERE status = 'approved'), 0) AS approved,
+                COALESCE(SUM(count) FILTER (WHERE status = 'rejected'), 0) AS rejected,
+                COALESCE(SUM(count) FILTER (WHERE status IN ('pending', 'in_review')), 0) AS pending,
+                COALESCE(SUM(count) FILTER (WHERE risk_level = 'high'), 0) AS high_risk
+            FROM verification_daily_stats
+        """)
+        row = cur.fetchone()
+        for key in ["total", "approved", "rejected", "pending", "high_risk"]:
+            stats[key] = int(row[key])
+        
+        start_date = datetime.now().date() - timedelta(days=days - 1)
+        cur.execute("""
+            SELECT day, SUM(count) AS count
+            FROM verification_daily_stats
+            WHERE day >= %s
+            GROUP BY day
+        """, (start_date,))
+        stats["daily"] = {r["day"]: int(r["count"]) for r in cur.fetchall()}
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f"Get dashboard stats error: {e}")
+    return stats
+
 def get_verification_by_id(ver_id):
     """Get a single verification by ID"""
     try:
@@ -327,17 +428,20 @@ def save_verification(verification):
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute("""
-            INSERT INTO verifications (id, document_type, document_url, status, risk_score, 
-                                       risk_level, customer_name, submitted_at, reviewed_at,
-                                       ocr_fields, risk_insights, validation_results)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO verifications (id, document_type, document_url, document_hash, document_mime_type,
+                                       status, risk_score, risk_level, customer_name, submitted_at,
+                                       reviewed_at, ocr_fields, risk_insights, validation_results,
+                                       processing_timings)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ON CONFLICT (id) DO UPDATE SET
                 status = EXCLUDED.status,
                 reviewed_at = EXCLUDED.reviewed_at
         """, (
             verification["id"],
             verification["documentType"],
-            verification["documentUrl"],
+            None if verification.get("documentHash") else verification["documentUrl"],
+            verification.get("documentHash"),
+            verification.get("documentMimeType"),
             verification["status"],
             verification["riskScore"],
             verification["riskLevel"],
@@ -346,7 +450,8 @@ def save_verification(verification):
             verification.get("reviewedAt"),
             json.dumps(verification.get("ocrFields", [])),
             json.dumps(verification.get("riskInsights", [])),
-            json.dumps(verification.get("validationResults", []))
+            json.dumps(verification.get("validationResults", [])),
+            json.dumps(verification["processingTimings"]) if verification.get("processingTimings") else None
         ))
         conn.commit()
         cur.close()
@@ -390,144 +495,149 @@ def save_chat_message(ver_id, message):
         print(f"Save chat message error: {e}")
 
 def log_audit_event(action, entity_type, entity_id=None, user_id="system", user_name="System", details=None, ip_address=None):
-    """Log an audit event to the database"""
+    """Queue an audit event for the background batched writer"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO audit_logs (id, action, entity_type, entity_id, user_id, user_name, details, ip_address, timestamp)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            str(uuid.uuid4()),
+        enqueue_audit_event(
             action,
             entity_type,
-            entity_id,
-            user_id,
-            user_name,
-            json.dumps(details) if details else None,
-            ip_address,
-            datetime.now()
-        ))
-        conn.commit()
-        cur.close()
-        conn.close()
+            entity_id=entity_id,
+            user_id=user_id,
+            user_name=user_name,
+            details=details,
+            ip_address=ip_address
+        )
     except Exception as e:
         print(f"Audit log error: {e}")
 
-def get_audit_logs(filters=None, limit=100, offset=0):
-    """Get audit logs with optional filtering"""
+AUDIT_EXPORT_CSV_HEADER = ["Timestamp", "Action", "Entity Type", "Entity ID", "User", "Details", "IP Address"]
+
+def stream_audit_log_export(filters=None, export_format="csv", fetch_size=2000, chunk_bytes=64 * 1024):
+    """Yield an audit log export chunk by chunk from a server-side cursor.
+    
+    Rows are fetched fetch_size at a time through a named cursor on a dedicated
+    pooled connection, so memory stays flat regardless of export size.
+    """
+    import csv
+    from io import StringIO
+    
+    query, params = build_audit_log_select(filters)
+    conn = borrow_connection()
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        query = "SELECT * FROM audit_logs WHERE 1=1"
-        params = []
+        cur = conn.cursor(name=f"audit_export_{uuid.uuid4().hex}")
+        cur.itersize = fetch_size
+        cur.execute(query, params)
         
-        if filters:
-            if filters.get("action"):
-                query += " AND action = %s"
-                params.append(filters["action"])
-            if filters.get("entity_type"):
-                query += " AND entity_type = %s"
-                params.append(filters["entity_type"])
-            if filters.get("entity_id"):
-                query += " AND entity_id = %s"
-                params.append(filters["entity_id"])
-            if filters.get("user_id"):
-                query += " AND user_id = %s"
-                params.append(filters["user_id"])
-            if filters.get("start_date"):
-                query += " AND timestamp >= %s"
-                params.append(filters["start_date"])
-            if filters.get("end_date"):
-                query += " AND timestamp <= %s"
-                params.append(filters["end_date"])
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(AUDIT_EXPORT_CSV_HEADER)
         
-        query += " ORDER BY timestamp DESC LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
+        for row in cur:
+            log = db_row_to_audit_log(row)
+            if export_format == "jsonl":
+                buffer.write(json.dumps(log) + "\n")
+            else:
+                writer.writerow([
+                    log["timestamp"],
+                    log["action"],
+                    log["entityType"],
+                    log["entityId"] or "",
+                    log["userName"],
+                    json.dumps(log["details"]) if log["details"] else "",
+                    log["ipAddress"] or ""
+                ])
+            if buffer.tell() >= chunk_bytes:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
         
-        cur.execute(query, params)
-        rows = cur.fetchall()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
         cur.close()
+    finally:
+        conn.rollback()
         conn.close()
-        
-        return [{
-            "id": row["id"],
-            "action": row["action"],
-            "entityType": row["entity_type"],
-            "entityId": row["entity_id"],
-            "userId": row["user_id"],
-            "userName": row["user_name"],
-            "details": row["details"],
-            "ipAddress": row["ip_address"],
-            "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None
-        } for row in rows]
-    except Exception as e:
-        print(f"Get audit logs error: {e}")
-        return []
 
-def get_audit_log_count(filters=None):
-    """Get total count of audit logs with optional filtering"""
+def gzip_stream(chunks):
+    """Gzip-compress a byte stream incrementally"""
+    import zlib
+    
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def get_audit_log_page(filters=None, limit=50, offset=0, after=None):
+    """Get a page of audit logs and the filtered total in one round trip"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        query = "SELECT COUNT(*) as count FROM audit_logs WHERE 1=1"
-        params = []
-        
-        if filters:
-            if filters.get("action"):
-                query += " AND action = %s"
-                params.append(filters["action"])
-            if filters.get("entity_type"):
-                query += " AND entity_type = %s"
-                params.append(filters["entity_type"])
-            if filters.get("entity_id"):
-                query += " AND entity_id = %s"
-                params.append(filters["entity_id"])
-            if filters.get("user_id"):
-                query += " AND user_id = %s"
-                params.append(filters["user_id"])
-            if filters.get("start_date"):
-                query += " AND timestamp >= %s"
-                params.append(filters["start_date"])
-            if filters.get("end_date"):
-                query += " AND timestamp <= %s"
-                params.append(filters["end_date"])
-        
-        cur.execute(query, params)
-        count = cur.fetchone()["count"]
+        page = query_audit_log_page(cur, filters, limit=limit, offset=offset, after=after)
         cur.close()
         conn.close()
-        return count
+        return page
     except Exception as e:
-        print(f"Get audit log count error: {e}")
-        return 0
+        print(f"Get audit logs error: {e}")
+        return {"logs": [], "total": 0, "totalIsEstimate": False, "last": None}
+
+def db_row_to_batch_job(row):
+    """Convert database row to batch job dict"""
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "status": row["status"],
+        "totalDocuments": row["total_documents"],
+        "processedDocuments": row["processed_documents"],
+        "successfulDocuments": row["successful_documents"],
+        "failedDocuments": row["failed_documents"],
+        "verificationIds": row["item_verification_ids"] or [],
+        "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
+        "startedAt": row["started_at"].isoformat() if row["started_at"] else None,
+        "completedAt": row["completed_at"].isoformat() if row["completed_at"] else None,
+        "errorMessage": row["error_message"]
+    }
+
+BATCH_JOB_SELECT = """
+    SELECT j.*, items.item_verification_ids
+    FROM batch_jobs j
+    LEFT JOIN LATERAL (
+        SELECT array_agg(i.verification_id ORDER BY i.position)
+               FILTER (WHERE i.verification_id IS NOT NULL) AS item_verification_ids
+        FROM batch_job_items i
+        WHERE i.batch_job_id = j.id
+    ) items ON TRUE
+"""
 
 def get_batch_job(job_id):
-    """Get a batch job by ID"""
+    """Get a batch job by ID, including its per-item status"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT * FROM batch_jobs WHERE id = %s", (job_id,))
+        cur.execute(BATCH_JOB_SELECT + " WHERE j.id = %s", (job_id,))
         row = cur.fetchone()
+        job = None
+        if row:
+            job = db_row_to_batch_job(row)
+            cur.execute("""
+                SELECT position, filename, status, attempts, verification_id, error_message, completed_at
+                FROM batch_job_items
+                WHERE batch_job_id = %s
+                ORDER BY position
+            """, (job_id,))
+            job["items"] = [{
+                "position": r["position"],
+                "filename": r["filename"],
+                "status": r["status"],
+                "attempts": r["attempts"],
+                "verificationId": r["verification_id"],
+                "errorMessage": r["error_message"],
+                "completedAt": r["completed_at"].isoformat() if r["completed_at"] else None
+            } for r in cur.fetchall()]
         cur.close()
         conn.close()
-        if row:
-            return {
-                "id": row["id"],
-                "name": row["name"],
-                "status": row["status"],
-                "totalDocuments": row["total_documents"],
-                "processedDocuments": row["processed_documents"],
-                "successfulDocuments": row["successful_documents"],
-                "failedDocuments": row["failed_documents"],
-                "verificationIds": row["verification_ids"] or [],
-                "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-                "startedAt": row["started_at"].isoformat() if row["started_at"] else None,
-                "completedAt": row["completed_at"].isoformat() if row["completed_at"] else None,
-                "errorMessage": row["error_message"]
-            }
+        return job
     except Exception as e:
         print(f"Get batch job error: {e}")
     return None
@@ -537,30 +647,17 @@ def get_all_batch_jobs():
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT * FROM batch_jobs ORDER BY created_at DESC")
+        cur.execute(BATCH_JOB_SELECT + " ORDER BY j.created_at DESC")
         rows = cur.fetchall()
         cur.close()
         conn.close()
-        return [{
-            "id": row["id"],
-            "name": row["name"],
-            "status": row["status"],
-            "totalDocuments": row["total_documents"],
-            "processedDocuments": row["processed_documents"],
-            "successfulDocuments": row["successful_documents"],
-            "failedDocuments": row["failed_documents"],
-            "verificationIds": row["verification_ids"] or [],
-            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-            "startedAt": row["started_at"].isoformat() if row["started_at"] else None,
-            "completedAt": row["completed_at"].isoformat() if row["completed_at"] else None,
-            "errorMessage": row["error_message"]
-        } for row in rows]
+        return [db_row_to_batch_job(row) for row in rows]
     except Exception as e:
         print(f"Get batch jobs error: {e}")
         return []
 
-def create_batch_job(name, total_documents):
-    """Create a new batch job"""
+def create_batch_job(name, documents):
+    """Create a batch job and queue one item per (filename, document_hash, mime_type)"""
     try:
         job_id = str(uuid.uuid4())
         conn = get_db_connection()
@@ -568,7 +665,13 @@ def create_batch_job(name, total_documents):
         cur.execute("""
             INSERT INTO batch_jobs (id, name, status, total_documents, created_at)
             VALUES (%s, %s, 'pending', %s, %s)
-        """, (job_id, name, total_documents, datetime.now()))
+        """, (job_id, name, len(documents), datetime.now()))
+        execute_values(
+            cur,
+            "INSERT INTO batch_job_items (batch_job_id, position, filename, document_hash, mime_type) VALUES %s",
+            [(job_id, position, filename, document_hash, mime_type)
+             for position, (filename, document_hash, mime_type) in enumerate(documents)]
+        )
         conn.commit()
         cur.close()
         conn.close()
@@ -577,61 +680,89 @@ def create_batch_job(name, total_documents):
         print(f"Create batch job error: {e}")
         return None
 
-def update_batch_job(job_id, updates):
-    """Update batch job progress"""
+def get_batch_verifications(job_id):
+    """Get a batch job's verifications in submission order with one query"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        set_clauses = []
-        params = []
-        
-        if "status" in updates:
-            set_clauses.append("status = %s")
-            params.append(updates["status"])
-        if "processed_documents" in updates:
-            set_clauses.append("processed_documents = %s")
-            params.append(updates["processed_documents"])
-        if "successful_documents" in updates:
-            set_clauses.append("successful_documents = %s")
-            params.append(updates["successful_documents"])
-        if "failed_documents" in updates:
-            set_clauses.append("failed_documents = %s")
-            params.append(updates["failed_documents"])
-        if "verification_ids" in updates:
-            set_clauses.append("verification_ids = %s")
-            params.append(json.dumps(updates["verification_ids"]))
-        if "started_at" in updates:
-            set_clauses.append("started_at = %s")
-            params.append(updates["started_at"])
-        if "completed_at" in updates:
-            set_clauses.append("completed_at = %s")
-            params.append(updates["completed_at"])
-        if "error_message" in updates:
-            set_clauses.append("error_message = %s")
-            params.append(updates["error_message"])
-        
-        if set_clauses:
-            params.append(job_id)
-            cur.execute(f"UPDATE batch_jobs SET {', '.join(set_clauses)} WHERE id = %s", params)
-            conn.commit()
-        
+        cur.execute("""
+            SELECT v.*
+            FROM batch_job_items i
+            JOIN verifications v ON v.id = i.verification_id
+            WHERE i.batch_job_id = %s
+            ORDER BY i.position
+        """, (job_id,))
+        rows = cur.fetchall()
         cur.close()
         conn.close()
+        return [db_row_to_verification(row) for row in rows]
     except Exception as e:
-        print(f"Update batch job error: {e}")
+        print(f"Get batch verifications error: {e}")
+        return []
 
-def process_single_document_for_batch(file_content, filename, mime_type):
-    """Process a single document as part of a batch job"""
-    try:
+VERIFICATION_STAGES = ["store", "ocr", "scoring", "dbWrite", "audit", "total"]
+verification_stage_metrics = StageMetrics(VERIFICATION_STAGES)
+
+class VerificationPipeline:
+    """Runs one document through storage, OCR, scoring, persistence and audit.
+    
+    Every stage's wall time is recorded in verification_stage_metrics. The
+    breakdown up to the database write is saved with the verification as
+    processingTimings; the returned copy also has the write, audit and total.
+    """
+    
+    def __init__(self, metrics=verification_stage_metrics):
+        self.metrics = metrics
+    
+    def run(self, filename, mime_type, document_hash=None, stream=None, ip_address=None, source="upload",
+            precomputed_ocr=None):
+        """Verify a document given either its stored hash or an upload stream to store first.
+        
+        `precomputed_ocr` is an (ocr_result, ocr_ms) pair for documents OCR'd together in a batch pack.
+        """
+        timer = self.metrics.timer()
         ver_id = str(uuid.uuid4())
-        doc_type = detect_document_type(filename)
+        doc_type = detect_document_type(filename or "")
+        
+        if stream is not None:
+            with timer.stage("store"):
+                document_hash = put_stream(stream)
+        
+        if precomputed_ocr is not None:
+            ocr_result, ocr_ms = precomputed_ocr
+            timer.record("ocr", ocr_ms)
+        else:
+            with timer.stage("ocr"):
+                ocr_result = get_ocr_result(document_hash, mime_type, doc_type)
+        
+        with timer.stage("scoring"):
+            verification = self.score(ver_id, doc_type, document_hash, mime_type, ocr_result)
         
-        file_base64 = base64.b64encode(file_content).decode("utf-8")
-        document_url = f"data:{mime_type};base64,{file_base64}"
+        verification["processingTimings"] = dict(timer.breakdown)
+        with timer.stage("dbWrite"):
+            save_verification(verification)
         
-        ocr_result = extract_ocr_with_vision(file_base64, mime_type, doc_type)
+        with timer.stage("audit"):
+            log_audit_event(
+                action="document_uploaded",
+                entity_type="verification",
+                entity_id=ver_id,
+                details={
+                    "documentType": verification["documentType"],
+                    "riskScore": verification["riskScore"],
+                    "riskLevel": verification["riskLevel"],
+                    "customerName": verification["customerName"],
+                    "status": verification["status"],
+                    "source": source
+                },
+                ip_address=ip_address
+            )
         
+        verification["processingTimings"] = timer.finish()
+        return verification
+    
+    def score(self, ver_id, doc_type, document_hash, mime_type, ocr_result):
+        """Build the verification record from an OCR result and the current settings"""
         if ocr_result and "document_analysis" in ocr_result:
             detected_type = ocr_result["document_analysis"].get("detected_type")
             if detected_type and detected_type in ["passport", "drivers_license", "national_id"]:
@@ -648,39 +779,26 @@ def process_single_document_for_batch(file_content, filename, mime_type):
         
         ocr_fields = generate_ocr_fields(doc_type, ocr_result)
         
-        name_field = next((f for f in ocr_fields if f["fieldName"] == "Full Name"), None)
-        dob_field = next((f for f in ocr_fields if f["fieldName"] == "Date of Birth"), None)
-        doc_num_field = next((f for f in ocr_fields if f["fieldName"] == "Document Number"), None)
-        
         validation_results = []
-        if name_field:
-            validation_results.append({
-                "fieldName": "Full Name", 
-                "submittedValue": "", 
-                "extractedValue": name_field["value"], 
-                "isMatch": True
-            })
-        if dob_field:
-            validation_results.append({
-                "fieldName": "Date of Birth", 
-                "submittedValue": "", 
-                "extractedValue": dob_field["value"], 
-                "isMatch": True
-            })
-        if doc_num_field:
-            validation_results.append({
-                "fieldName": "Document Number", 
-                "submittedValue": "", 
-                "extractedValue": doc_num_field["value"], 
-                "isMatch": True
-            })
+        for field_name in ["Full Name", "Date of Birth", "Document Number"]:
+            field = next((f for f in ocr_fields if f["fieldName"] == field_name), None)
+            if field:
+                validation_results.append({
+                    "fieldName": field_name,
+                    "submittedValue": "",
+                    "extractedValue": field["value"],
+                    "isMatch": True
+                })
         
+        name_field = next((f for f in ocr_fields if f["fieldName"] == "Full Name"), None)
         customer_name = name_field["value"] if name_field else f"Customer {ver_id[:8]}"
         
-        verification = {
+        return {
             "id": ver_id,
             "documentType": doc_type,
-            "documentUrl": document_url,
+            "documentUrl": document_url_for(document_hash),
+            "documentHash": document_hash,
+            "documentMimeType": mime_type,
             "status": status,
             "riskScore": risk_score,
             "riskLevel": risk_level,
@@ -692,13 +810,49 @@ def process_single_document_for_batch(file_content, filename, mime_type):
             "validationResults": validation_results,
             "chatHistory": []
         }
-        
-        save_verification(verification)
-        
-        return {"success": True, "verification_id": ver_id, "status": status}
+
+verification_pipeline = VerificationPipeline()
+
+def process_single_document_for_batch(document_hash, filename, mime_type):
+    """Process a single stored document as part of a batch job"""
+    return process_documents_for_batch([
+        {"document_hash": document_hash, "filename": filename, "mime_type": mime_type}
+    ])[0]
+
+def process_documents_for_batch(documents):
+    """Process stored batch documents, sharing Vision requests between them where possible.
+    
+    `documents` are dicts with document_hash, filename and mime_type; one result is returned per document.
+    """
+    results = [None] * len(documents)
+    runnable = []
+    for index, document in enumerate(documents):
+        if blob_exists(document["document_hash"]):
+            runnable.append(index)
+        else:
+            results[index] = {"success": False, "error": "Document not found in blob store"}
+    
+    try:
+        ocr_results = get_ocr_results_for_batch([
+            (documents[i]["document_hash"], documents[i]["mime_type"], detect_document_type(documents[i]["filename"] or ""))
+            for i in runnable
+        ])
     except Exception as e:
-        print(f"Process document error: {e}")
-        return {"success": False, "error": str(e)}
+        print(f"Batch OCR error: {e}")
+        ocr_results = [None] * len(runnable)
+    
+    for index, precomputed in zip(runnable, ocr_results):
+        document = documents[index]
+        try:
+            verification = verification_pipeline.run(
+                document["filename"], document["mime_type"], document_hash=document["document_hash"],
+                source="batch", precomputed_ocr=precomputed
+            )
+            results[index] = {"success": True, "verification_id": verification["id"], "status": verification["status"]}
+        except Exception as e:
+            print(f"Process document error: {e}")
+            results[index] = {"success": False, "error": str(e)}
+    return results
 
 
 def detect_document_type(filename):
@@ -711,49 +865,105 @@ def detect_document_type(filename):
     else:
         return "national_id"
 
-def extract_ocr_with_vision(image_base64, mime_type, doc_type):
-    """Use OpenAI Vision to extract text and data from document image"""
+# Bump whenever the OCR prompt, model or image preprocessing changes so cached results are not reused
+OCR_PROMPT_VERSION = "gpt-4o-v2"
+
+def get_ocr_result(document_hash, mime_type, doc_type):
+    """OCR a stored document, reusing a cached result for identical content"""
+    cached = ocr_cache.get(document_hash, doc_type, OCR_PROMPT_VERSION)
+    if cached is not None:
+        return cached
+    
+    # Preprocess straight from the blob store so the upload is never held in memory whole
+    prepared = preprocess_document(blob_path(document_hash), mime_type)
+    
+    ocr_result = extract_ocr_with_vision(prepared["images"], doc_type)
+    if ocr_result is not None:
+        ocr_cache.put(document_hash, doc_type, OCR_PROMPT_VERSION, ocr_result)
+    return ocr_result
+
+def get_ocr_results_for_batch(documents):
+    """OCR several stored documents, packing uncached single-image ones into shared Vision requests.
+    
+    `documents` is a list of (document_hash, mime_type, doc_type). Returns one (ocr_result, ocr_ms)
+    pair per document, where ocr_ms covers the cache lookup, preprocessing and the request it was part of.
+    """
+    results = [None] * len(documents)
+    elapsed_ms = [0.0] * len(documents)
+    pending, prepared_images = [], []
+    
+    for index, (document_hash, mime_type, doc_type) in enumerate(documents):
+        start = time.perf_counter()
+        cached = ocr_cache.get(document_hash, doc_type, OCR_PROMPT_VERSION)
+        if cached is not None:
+            results[index] = cached
+        else:
+            prepared = preprocess_document(blob_path(document_hash), mime_type)
+            pending.append(index)
+            prepared_images.append(prepared["images"])
+        elapsed_ms[index] += (time.perf_counter() - start) * 1000
+    
+    for pack in plan_packs(prepared_images):
+        start = time.perf_counter()
+        indexes = [pending[i] for i in pack]
+        doc_types = [documents[i][2] for i in indexes]
+        
+        pack_results = None
+        if len(pack) > 1:
+            pack_results = extract_ocr_pack_with_vision([prepared_images[i][0] for i in pack], doc_types)
+            if pack_results is None:
+                print(f"[ocr-pack] Pack of {len(pack)} could not be used, falling back to per-image requests")
+            record_pack(len(pack), fell_back=pack_results is None)
+        else:
+            record_pack(1)
+        if pack_results is None:
+            pack_results = [extract_ocr_with_vision(prepared_images[i], doc_type) for i, doc_type in zip(pack, doc_types)]
+        
+        pack_ms = (time.perf_counter() - start) * 1000
+        for index, doc_type, ocr_result in zip(indexes, doc_types, pack_results):
+            results[index] = ocr_result
+            elapsed_ms[index] += pack_ms
+            if ocr_result is not None:
+                ocr_cache.put(documents[index][0], doc_type, OCR_PROMPT_VERSION, ocr_result)
+    
+    return [(result, round(ms, 2)) for result, ms in zip(results, elapsed_ms)]
+
+def vision_image_parts(images):
+    return [
+        {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}",
+                "detail": "high"
+            }
+        }
+        for data, mime_type in images
+    ]
+
+def extract_ocr_with_vision(images, doc_type):
+    """Use OpenAI Vision to extract text and data from document images.
+    
+    `images` is a list of (bytes, mime_type); multi-page documents send one image per page.
+    """
     try:
-        prompt = f"""Analyze this {doc_type.replace('_', ' ')} document image and extract all visible text fields.
+        pages_note = f" The document is split across {len(images)} page images." if len(images) > 1 else ""
+        prompt = f"""Analyze this {doc_type.replace('_', ' ')} document image and extract all visible text fields.{pages_note}
 
 Return a JSON object with the following structure:
-{{
-    "extracted_fields": [
-        {{"fieldName": "Full Name", "value": "extracted value", "confidence": 95}},
-        {{"fieldName": "Document Number", "value": "extracted value", "confidence": 98}},
-        {{"fieldName": "Date of Birth", "value": "YYYY-MM-DD format", "confidence": 92}},
-        {{"fieldName": "Expiry Date", "value": "YYYY-MM-DD format", "confidence": 90}},
-        {{"fieldName": "Issuing Country", "value": "country name", "confidence": 88}}
-    ],
-    "document_analysis": {{
-        "detected_type": "passport|drivers_license|national_id",
-        "quality_score": 85,
-        "is_readable": true,
-        "potential_issues": ["list any visible issues like blur, damage, etc"]
-    }}
-}}
+{OCR_RESULT_SCHEMA}
 
 Only include fields that are actually visible in the document. Estimate confidence based on text clarity."""
 
-        response = client.chat.completions.create(
+        response = openai_limiter.call(lambda: client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{image_base64}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
+                    "content": [{"type": "text", "text": prompt}] + vision_image_parts(images)
                 }
             ],
             max_tokens=1000
-        )
+        ), estimated_tokens=estimate_tokens(len(prompt), 1000, images=len(images)))
         
         response_text = response.choices[0].message.content
         json_start = response_text.find('{')
@@ -766,6 +976,32 @@ Only include fields that are actually visible in the document. Estimate confiden
     
     return None
 
+def extract_ocr_pack_with_vision(images, doc_types):
+    """OCR several single-image documents in one Vision request.
+    
+    Returns one result per image in order, or None if the request failed or the
+    response could not be matched to every image.
+    """
+    try:
+        prompt = build_pack_prompt(doc_types)
+        max_tokens = pack_output_tokens(len(images))
+        response = openai_limiter.call(lambda: client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [{"type": "text", "text": prompt}] + vision_image_parts(images)
+                }
+            ],
+            max_tokens=max_tokens
+        ), estimated_tokens=estimate_tokens(len(prompt), max_tokens) + sum(image_tokens(data) for data, _ in images))
+        
+        return parse_pack_response(response.choices[0].message.content or "", len(images))
+    except Exception as e:
+        print(f"Vision OCR pack error: {e}")
+    
+    return None
+
 def calculate_risk_score(ocr_result, doc_type):
     """Calculate risk score based on document analysis"""
     base_score = 20
@@ -843,45 +1079,99 @@ def generate_risk_insights(risk_score):
             {"category": "Metadata", "description": "File metadata suggests recent editing", "severity": "medium"},
         ]
 
+def uploaded_file_size(file):
+    """Size of an uploaded file; Werkzeug has already spooled it, so this does not read it"""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit"}), 413
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
 
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics_route():
+    """Get runtime metrics for backend subsystems"""
+    return jsonify({
+        "dbPool": get_pool_stats(),
+        "auditWriter": get_audit_writer_stats(),
+        "settingsCache": settings_cache.stats(),
+        "ocrCache": get_ocr_cache_stats(),
+        "imagePreprocess": get_preprocess_stats(),
+        "openaiLimiter": get_openai_limiter_stats(),
+        "embeddingLimiter": get_embedding_limiter_stats(),
+        "queryEmbeddingCache": get_query_embedding_cache_stats(),
+        "ocrPacking": get_ocr_packing_stats(),
+        "verificationStages": verification_stage_metrics.stats()
+    })
+
 @app.route("/api/dashboard", methods=["GET"])
 def get_dashboard_route():
-    all_verifications = get_all_verifications()
-    total = len(all_verifications)
-    approved = sum(1 for v in all_verifications if v["status"] == "approved")
-    rejected = sum(1 for v in all_verifications if v["status"] == "rejected")
-    pending = sum(1 for v in all_verifications if v["status"] in ["pending", "in_review"])
-    high_risk = sum(1 for v in all_verifications if v["riskLevel"] == "high")
+    stats = get_dashboard_stats(days=30)
+    total = stats["total"]
+    approved = stats["approved"]
     
     auto_approval_rate = round((approved / total * 100) if total > 0 else 0)
     
-    recent = all_verifications[:10]
+    recent = get_recent_verifications(limit=10)
     
     volume_data = []
     for i in range(30):
-        date = (datetime.now() - timedelta(days=29-i)).strftime("%b %d")
         target_date = (datetime.now() - timedelta(days=29-i)).date()
-        count = sum(1 for v in all_verifications 
-                   if v.get("submittedAt") and datetime.fromisoformat(v["submittedAt"]).date() == target_date)
-        volume_data.append({"date": date, "count": count})
+        volume_data.append({"date": target_date.strftime("%b %d"), "count": stats["daily"].get(target_date, 0)})
     
     return jsonify({
         "totalVerifications": total,
         "approvedCount": approved,
-        "rejectedCount": rejected,
+        "rejectedCount": stats["rejected"],
         "autoApprovalRate": auto_approval_rate,
-        "pendingReview": pending,
-        "highRiskFlags": high_risk,
+        "pendingReview": stats["pending"],
+        "highRiskFlags": stats["high_risk"],
         "recentVerifications": recent,
         "volumeData": volume_data
     })
 
 @app.route("/api/verifications", methods=["GET"])
 def get_verifications_route():
-    return jsonify(get_all_verifications())
+    """List verifications with keyset pagination, field projection and filters"""
+    filters = {}
+    if request.args.get("status"):
+        filters["status"] = request.args.get("status").split(",")
+    if request.args.get("riskLevel"):
+        filters["risk_level"] = request.args.get("riskLevel").split(",")
+    if request.args.get("documentType"):
+        filters["document_type"] = request.args.get("documentType").split(",")
+    
+    fields = None
+    if request.args.get("fields"):
+        fields = [f.strip() for f in request.args.get("fields").split(",") if f.strip()]
+        unknown = [f for f in fields if f not in VERIFICATION_FIELD_COLUMNS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    cursor = request.args.get("cursor")
+    
+    try:
+        page = get_verifications_page(filters if filters else None, limit, cursor, fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Get verifications page error: {e}")
+        return jsonify({"verifications": [], "nextCursor": None, "limit": limit})
+    
+    page["limit"] = limit
+    return jsonify(page)
 
 @app.route("/api/verifications/<verification_id>", methods=["GET"])
 def get_verification_route(verification_id):
@@ -892,102 +1182,42 @@ def get_verification_route(verification_id):
 
 @app.route("/api/verifications", methods=["POST"])
 def create_verification():
+    # Checked against Content-Length before the body is read
+    request.max_content_length = MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES
     if "document" not in request.files:
         return jsonify({"error": "No document provided"}), 400
     
     file = request.files["document"]
     if file.filename == "":
         return jsonify({"error": "No file selected"}), 400
+    if uploaded_file_size(file) > MAX_UPLOAD_BYTES:
+        return jsonify({"error": f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit"}), 413
     
-    ver_id = str(uuid.uuid4())
-    doc_type = detect_document_type(file.filename)
-    
-    file_content = file.read()
-    file_base64 = base64.b64encode(file_content).decode("utf-8")
-    mime_type = file.content_type or "image/jpeg"
-    document_url = f"data:{mime_type};base64,{file_base64}"
-    
-    ocr_result = extract_ocr_with_vision(file_base64, mime_type, doc_type)
-    
-    if ocr_result and "document_analysis" in ocr_result:
-        detected_type = ocr_result["document_analysis"].get("detected_type")
-        if detected_type and detected_type in ["passport", "drivers_license", "national_id"]:
-            doc_type = detected_type
-    
-    risk_score = calculate_risk_score(ocr_result, doc_type)
-    risk_level = "low" if risk_score < 30 else ("medium" if risk_score < 70 else "high")
-    
-    current_settings = get_settings()
-    auto_approve = risk_score < current_settings["autoApproveThreshold"]
-    auto_reject = current_settings["autoRejectHighRisk"] and risk_score > current_settings["highRiskThreshold"]
-    
-    status = "approved" if auto_approve else ("rejected" if auto_reject else "pending")
-    
-    ocr_fields = generate_ocr_fields(doc_type, ocr_result)
-    
-    name_field = next((f for f in ocr_fields if f["fieldName"] == "Full Name"), None)
-    dob_field = next((f for f in ocr_fields if f["fieldName"] == "Date of Birth"), None)
-    doc_num_field = next((f for f in ocr_fields if f["fieldName"] == "Document Number"), None)
-    
-    validation_results = []
-    if name_field:
-        validation_results.append({
-            "fieldName": "Full Name", 
-            "submittedValue": "", 
-            "extractedValue": name_field["value"], 
-            "isMatch": True
-        })
-    if dob_field:
-        validation_results.append({
-            "fieldName": "Date of Birth", 
-            "submittedValue": "", 
-            "extractedValue": dob_field["value"], 
-            "isMatch": True
-        })
-    if doc_num_field:
-        validation_results.append({
-            "fieldName": "Document Number", 
-            "submittedValue": "", 
-            "extractedValue": doc_num_field["value"], 
-            "isMatch": True
-        })
-    
-    customer_name = name_field["value"] if name_field else f"Customer {ver_id[:8]}"
-    
-    verification = {
-        "id": ver_id,
-        "documentType": doc_type,
-        "documentUrl": document_url,
-        "status": status,
-        "riskScore": risk_score,
-        "riskLevel": risk_level,
-        "customerName": customer_name,
-        "submittedAt": datetime.now().isoformat(),
-        "reviewedAt": datetime.now().isoformat() if status in ["approved", "rejected"] else None,
-        "ocrFields": ocr_fields,
-        "riskInsights": generate_risk_insights(risk_score),
-        "validationResults": validation_results,
-        "chatHistory": []
-    }
-    
-    save_verification(verification)
-    
-    log_audit_event(
-        action="document_uploaded",
-        entity_type="verification",
-        entity_id=ver_id,
-        details={
-            "documentType": doc_type,
-            "riskScore": risk_score,
-            "riskLevel": risk_level,
-            "customerName": customer_name,
-            "status": status
-        },
+    verification = verification_pipeline.run(
+        file.filename,
+        file.content_type or "image/jpeg",
+        stream=file.stream,
         ip_address=request.remote_addr
     )
     
     return jsonify(verification), 201
 
+@app.route("/api/documents/<digest>", methods=["GET"])
+def get_document_route(digest):
+    """Stream a stored document image by its SHA-256 digest"""
+    if not blob_exists(digest):
+        return jsonify({"error": "Document not found"}), 404
+    
+    response = send_file(
+        blob_path(digest),
+        mimetype=sniff_content_type(digest),
+        conditional=True,
+        etag=digest,
+        max_age=31536000
+    )
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
 @app.route("/api/verifications/<verification_id>", methods=["PATCH"])
 def update_verification_route(verification_id):
     verification = get_verification_by_id(verification_id)
@@ -1093,14 +1323,15 @@ Risk Insights:
 Please provide helpful, concise responses about this document. If asked about approval recommendations, consider the risk score and insights."""
 
     try:
-        response = client.chat.completions.create(
+        messages = [
+            {"role": "system", "content": context},
+            *[{"role": m["role"], "content": m["content"]} for m in chat_history[-10:]]
+        ]
+        response = openai_limiter.call(lambda: client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": context},
-                *[{"role": m["role"], "content": m["content"]} for m in chat_history[-10:]]
-            ],
+            messages=messages,
             max_tokens=500
-        )
+        ), estimated_tokens=estimate_tokens(sum(len(m["content"] or "") for m in messages), 500))
         return response.choices[0].message.content
     except Exception as e:
         return f"I'm currently analyzing this document. Based on the risk score of {verification['riskScore']}, this document is classified as {verification['riskLevel']} risk. The OCR extraction identified {len(verification['ocrFields'])} fields with high confidence. Would you like me to explain any specific aspect of this verification?"
@@ -1132,11 +1363,33 @@ def update_settings_route():
         ip_address=request.remote_addr
     )
     
+    if any(old_settings.get(key) != current.get(key) for key in RESCORE_SETTING_KEYS):
+        start_background_rescore(current, request.remote_addr)
+    
     return jsonify(current)
 
-@app.route("/api/audit-logs", methods=["GET"])
-def get_audit_logs_route():
-    """Get audit logs with optional filtering and pagination"""
+def start_background_rescore(settings, ip_address=None):
+    """Re-decide pending verifications off the request thread"""
+    def run():
+        try:
+            rescore_pending_verifications(settings, reason="settings_updated", ip_address=ip_address)
+        except Exception as e:
+            print(f"Rescore error: {e}")
+    
+    threading.Thread(target=run, name="rescore", daemon=True).start()
+
+@app.route("/api/verifications/rescore", methods=["POST"])
+def rescore_verifications_route():
+    """Re-decide every pending verification against the current thresholds"""
+    try:
+        summary = rescore_pending_verifications(get_settings(), reason="manual", ip_address=request.remote_addr)
+    except Exception as e:
+        print(f"Rescore error: {e}")
+        return jsonify({"error": "Rescore failed"}), 500
+    return jsonify(summary)
+
+def get_audit_log_filters_from_request():
+    """Read audit log filters from the query string"""
     filters = {}
     if request.args.get("action"):
         filters["action"] = request.args.get("action")
@@ -1150,59 +1403,59 @@ def get_audit_logs_route():
         filters["start_date"] = request.args.get("startDate")
     if request.args.get("endDate"):
         filters["end_date"] = request.args.get("endDate")
+    return filters
+
+@app.route("/api/audit-logs", methods=["GET"])
+def get_audit_logs_route():
+    """Get audit logs with optional filtering and pagination"""
+    filters = get_audit_log_filters_from_request()
     
     limit = int(request.args.get("limit", 50))
     offset = int(request.args.get("offset", 0))
     
-    logs = get_audit_logs(filters if filters else None, limit, offset)
-    total = get_audit_log_count(filters if filters else None)
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = decode_cursor(request.args.get("cursor"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if after[0] is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+        offset = 0
+    
+    page = get_audit_log_page(filters if filters else None, limit, offset, after)
     
     return jsonify({
-        "logs": logs,
-        "total": total,
+        "logs": page["logs"],
+        "total": page["total"],
+        "totalIsEstimate": page["totalIsEstimate"],
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "nextCursor": encode_cursor(*page["last"]) if page["last"] else None
     })
 
 @app.route("/api/audit-logs/export", methods=["GET"])
 def export_audit_logs_route():
-    """Export audit logs as CSV"""
-    import csv
-    from io import StringIO
-    
-    filters = {}
-    if request.args.get("action"):
-        filters["action"] = request.args.get("action")
-    if request.args.get("entityType"):
-        filters["entity_type"] = request.args.get("entityType")
-    if request.args.get("startDate"):
-        filters["start_date"] = request.args.get("startDate")
-    if request.args.get("endDate"):
-        filters["end_date"] = request.args.get("endDate")
-    
-    logs = get_audit_logs(filters if filters else None, limit=10000, offset=0)
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Timestamp", "Action", "Entity Type", "Entity ID", "User", "Details", "IP Address"])
-    
-    for log in logs:
-        writer.writerow([
-            log["timestamp"],
-            log["action"],
-            log["entityType"],
-            log["entityId"] or "",
-            log["userName"],
-            json.dumps(log["details"]) if log["details"] else "",
-            log["ipAddress"] or ""
-        ])
-    
-    output.seek(0)
-    return send_file(
-        BytesIO(output.getvalue().encode('utf-8')),
-        mimetype="text/csv",
-        as_attachment=True,
-        download_name=f"audit_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    """Stream audit logs as CSV (default) or JSONL, optionally gzipped"""
+    filters = get_audit_log_filters_from_request()
+    export_format = request.args.get("format", "csv").lower()
+    if export_format not in ["csv", "jsonl"]:
+        return jsonify({"error": "Unsupported export format"}), 400
+    use_gzip = request.args.get("gzip", "").lower() in ["1", "true", "yes"]
+    
+    filename = f"audit_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    
+    body = stream_audit_log_export(filters if filters else None, export_format)
+    if use_gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    
+    return Response(
+        body,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.route("/api/audit-logs/stats", methods=["GET"])
@@ -1259,7 +1512,8 @@ def get_batch_job_route(job_id):
 
 @app.route("/api/batch-jobs", methods=["POST"])
 def create_batch_job_route():
-    """Create a new batch job and process documents"""
+    """Queue a new batch job; documents are processed by batch_worker.py"""
+    request.max_content_length = MAX_BATCH_DOCUMENTS * MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES
     if "documents" not in request.files:
         return jsonify({"error": "No documents provided"}), 400
     
@@ -1267,17 +1521,22 @@ def create_batch_job_route():
     if len(files) == 0:
         return jsonify({"error": "No files selected"}), 400
     
-    if len(files) > 50:
-        return jsonify({"error": "Maximum 50 documents per batch"}), 400
+    if len(files) > MAX_BATCH_DOCUMENTS:
+        return jsonify({"error": f"Maximum {MAX_BATCH_DOCUMENTS} documents per batch"}), 400
+    
+    oversized = [file.filename for file in files if uploaded_file_size(file) > MAX_UPLOAD_BYTES]
+    if oversized:
+        return jsonify({"error": f"Documents exceed the {MAX_UPLOAD_BYTES} byte limit", "files": oversized}), 413
     
     batch_name = request.form.get("name", f"Batch {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     
-    job_id = create_batch_job(batch_name, len(files))
+    # Persist every upload before queueing; workers read the documents back from the blob store
+    documents = [(file.filename, put_stream(file.stream), file.content_type or "image/jpeg") for file in files]
+    
+    job_id = create_batch_job(batch_name, documents)
     if not job_id:
         return jsonify({"error": "Failed to create batch job"}), 500
     
-    update_batch_job(job_id, {"status": "processing", "started_at": datetime.now()})
-    
     log_audit_event(
         action="batch_job_started",
         entity_type="batch_job",
@@ -1286,56 +1545,8 @@ def create_batch_job_route():
         ip_address=request.remote_addr
     )
     
-    verification_ids = []
-    successful = 0
-    failed = 0
-    
-    for i, file in enumerate(files):
-        try:
-            file_content = file.read()
-            mime_type = file.content_type or "image/jpeg"
-            result = process_single_document_for_batch(file_content, file.filename, mime_type)
-            
-            if result["success"]:
-                verification_ids.append(result["verification_id"])
-                successful += 1
-            else:
-                failed += 1
-            
-            update_batch_job(job_id, {
-                "processed_documents": i + 1,
-                "successful_documents": successful,
-                "failed_documents": failed,
-                "verification_ids": verification_ids
-            })
-        except Exception as e:
-            print(f"Batch document processing error: {e}")
-            failed += 1
-            update_batch_job(job_id, {
-                "processed_documents": i + 1,
-                "failed_documents": failed
-            })
-    
-    final_status = "completed" if failed == 0 else ("completed_with_errors" if successful > 0 else "failed")
-    update_batch_job(job_id, {
-        "status": final_status,
-        "completed_at": datetime.now()
-    })
-    
-    log_audit_event(
-        action="batch_job_completed",
-        entity_type="batch_job",
-        entity_id=job_id,
-        details={
-            "name": batch_name,
-            "status": final_status,
-            "successful": successful,
-            "failed": failed
-        },
-        ip_address=request.remote_addr
-    )
-    
-    return jsonify(get_batch_job(job_id)), 201
+    job = get_batch_job(job_id)
+    return jsonify(job), 202, {"Location": f"/api/batch-jobs/{job_id}"}
 
 @app.route("/api/batch-jobs/<job_id>/verifications", methods=["GET"])
 def get_batch_verifications_route(job_id):
@@ -1344,13 +1555,7 @@ def get_batch_verifications_route(job_id):
     if not job:
         return jsonify({"error": "Batch job not found"}), 404
     
-    verifications = []
-    for ver_id in job.get("verificationIds", []):
-        ver = get_verification_by_id(ver_id)
-        if ver:
-            verifications.append(ver)
-    
-    return jsonify(verifications)
+    return jsonify(get_batch_verifications(job_id))
 
 @app.route("/api/batch-jobs/stats", methods=["GET"])
 def get_batch_stats_route():
@@ -1555,36 +1760,71 @@ def run_workflow_route(verification_id):
         return jsonify({"error": str(e)}), 500
 
 
+def bounded_int_option(data: dict, key: str, default: int, low: int, high: int) -> int:
+    """Read an integer body option, clamped to [low, high]; raises ValueError if it is not an integer"""
+    value = data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'"{key}" must be an integer')
+    return min(max(value, low), high)
+
+
 @app.route("/api/rag/embed", methods=["POST"])
 def embed_documents_route():
-    """Manually trigger document embedding for existing verifications"""
+    """Embed new or changed verifications and fraud patterns in parallel chunks.
+    
+    Optional JSON body: {"chunkSize": 100, "concurrency": 4, "force": false, "dryRun": false}.
+    chunkSize is capped at RAG_EMBED_MAX_CHUNK_SIZE and concurrency at RAG_EMBED_CONCURRENCY.
+    Documents whose content is unchanged since they were embedded are skipped unless
+    "force" is set; "dryRun" only reports how many would be embedded. Chunks that fail
+    are listed in "failures" with their verification IDs.
+    """
     if not RAG_ENABLED:
         return jsonify({"error": "RAG service not available"}), 503
     
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get("force", False))
+    dry_run = bool(data.get("dryRun", False))
+    try:
+        chunk_size = bounded_int_option(data, "chunkSize", RAG_EMBED_CHUNK_SIZE, 1, RAG_EMBED_MAX_CHUNK_SIZE)
+        concurrency = bounded_int_option(data, "concurrency", RAG_EMBED_CONCURRENCY, 1, RAG_EMBED_CONCURRENCY)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     try:
         all_verifications = get_all_verifications()
-        embedded_count = 0
+        # The embedding threads have no request context; give the connection back before they run
+        yield_request_connection()
+        report = embed_verifications_bulk(
+            all_verifications,
+            chunk_size=chunk_size,
+            concurrency=concurrency,
+            force=force,
+            dry_run=dry_run
+        )
         
-        for verification in all_verifications:
-            result = create_document_embedding(verification)
-            if result:
-                embedded_count += 1
+        pattern_count = store_fraud_pattern_embeddings(fraud_patterns, force=force, dry_run=dry_run)
         
-        pattern_count = store_fraud_pattern_embeddings(fraud_patterns)
+        if dry_run:
+            return jsonify({**report, "patternsToEmbed": pattern_count})
         
         log_audit_event(
             action="bulk_embedding",
             entity_type="rag",
             details={
-                "verifications_embedded": embedded_count,
-                "patterns_embedded": pattern_count
+                "verifications_embedded": report["verificationsEmbedded"],
+                "verifications_unchanged": report["verificationsUnchanged"],
+                "verifications_failed": report["verificationsFailed"],
+                "failed_chunks": report["failedChunks"],
+                "duration_ms": report["durationMs"],
+                "patterns_embedded": pattern_count,
+                "force": force
             },
             ip_address=request.remote_addr
         )
         
         return jsonify({
-            "success": True,
-            "verificationsEmbedded": embedded_count,
+            "success": report["failedChunks"] == 0,
+            **report,
             "patternsEmbedded": pattern_count
         })
     except Exception as e:
@@ -1592,5 +1832,7 @@ def embed_documents_route():
 
 
 if __name__ == "__main__":
+    # Turn SIGTERM into a normal exit so atexit hooks (audit queue flush) run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     port = int(os.environ.get("FLASK_PORT", 5001))
     app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
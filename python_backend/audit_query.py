@@ -0,0 +1,121 @@
+"""
+Audit Query Module - Shared audit log query builder
+One place that turns audit log filters into SQL, used by listing, counting
+and export:
+- Page and total fetched in a single round trip
+- Exact count for small result sets, planner estimate above a threshold
+- Keyset (timestamp, id) cursors for deep pages instead of OFFSET
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+AUDIT_EXACT_COUNT_THRESHOLD = int(os.environ.get("AUDIT_EXACT_COUNT_THRESHOLD", 10000))
+
+
+def db_row_to_audit_log(row) -> Dict[str, Any]:
+    """Convert database row to audit log dict"""
+    return {
+        "id": row["id"],
+        "action": row["action"],
+        "entityType": row["entity_type"],
+        "entityId": row["entity_id"],
+        "userId": row["user_id"],
+        "userName": row["user_name"],
+        "details": row["details"],
+        "ipAddress": row["ip_address"],
+        "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None
+    }
+
+
+def build_audit_log_where(filters: Optional[Dict] = None) -> Tuple[str, List]:
+    """Build the WHERE clause and params for audit log filters"""
+    query = "WHERE 1=1"
+    params = []
+
+    if filters:
+        if filters.get("action"):
+            query += " AND action = %s"
+            params.append(filters["action"])
+        if filters.get("entity_type"):
+            query += " AND entity_type = %s"
+            params.append(filters["entity_type"])
+        if filters.get("entity_id"):
+            query += " AND entity_id = %s"
+            params.append(filters["entity_id"])
+        if filters.get("user_id"):
+            query += " AND user_id = %s"
+            params.append(filters["user_id"])
+        if filters.get("start_date"):
+            query += " AND timestamp >= %s"
+            params.append(filters["start_date"])
+        if filters.get("end_date"):
+            query += " AND timestamp <= %s"
+            params.append(filters["end_date"])
+
+    return query, params
+
+
+def build_audit_log_select(filters: Optional[Dict] = None) -> Tuple[str, List]:
+    """Full ordered SELECT for every audit log matching the filters"""
+    where, params = build_audit_log_where(filters)
+    return f"SELECT * FROM audit_logs {where} ORDER BY timestamp DESC, id DESC", params
+
+
+def query_audit_log_page(cur, filters: Optional[Dict] = None, limit: int = 50, offset: int = 0,
+                         after: Optional[Tuple[datetime, str]] = None,
+                         exact_threshold: int = AUDIT_EXACT_COUNT_THRESHOLD) -> Dict[str, Any]:
+    """Fetch one page of audit logs and the filtered total in one statement.
+
+    The planner's row estimate decides how to count: at or below
+    exact_threshold the total is an exact COUNT(*), above it the estimate
+    itself is returned and flagged. When `after` is a (timestamp, id)
+    keyset position, the page starts right after it and offset is ignored.
+    """
+    where, params = build_audit_log_where(filters)
+    estimate_sql = cur.mogrify(f"SELECT 1 FROM audit_logs {where}", params).decode("utf-8")
+
+    page_where = where
+    page_params = list(params)
+    if after is not None:
+        page_where += " AND (timestamp, id) < (%s, %s)"
+        page_params.extend(after)
+        offset = 0
+
+    cur.execute(f"""
+        WITH estimate AS (
+            SELECT count_estimate(%s) AS estimated
+        ),
+        total AS (
+            SELECT
+                CASE WHEN estimate.estimated > %s THEN estimate.estimated
+                     ELSE (SELECT COUNT(*) FROM audit_logs {where})
+                END AS total_count,
+                estimate.estimated > %s AS total_is_estimate
+            FROM estimate
+        )
+        SELECT page.*, total.total_count, total.total_is_estimate
+        FROM total
+        LEFT JOIN LATERAL (
+            SELECT * FROM audit_logs {page_where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s OFFSET %s
+        ) page ON TRUE
+    """, [estimate_sql, exact_threshold, *params, exact_threshold, *page_params, limit, offset])
+    rows = cur.fetchall()
+
+    total = int(rows[0]["total_count"]) if rows else 0
+    is_estimate = bool(rows[0]["total_is_estimate"]) if rows else False
+    rows = [row for row in rows if row["id"] is not None]
+
+    last = None
+    if len(rows) == limit:
+        last = (rows[-1]["timestamp"], rows[-1]["id"])
+
+    return {
+        "logs": [db_row_to_audit_log(row) for row in rows],
+        "total": total,
+        "totalIsEstimate": is_estimate,
+        "last": last
+    }
@@ -0,0 +1,272 @@
+"""
+Audit Writer Module - Asynchronous, batched audit log persistence
+Audit events are queued in memory and written by a background thread:
+- Multi-row INSERT flushed on a size or time trigger
+- Bounded queue with a block-or-spill policy when full
+- Failed and overflow batches spilled to a local JSONL file and replayed
+- Durable flush on interpreter shutdown
+- Queue depth and flush latency metrics
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import queue
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from db import get_db_connection
+
+AUDIT_QUEUE_MAX = int(os.environ.get("AUDIT_QUEUE_MAX", 10000))
+AUDIT_FLUSH_BATCH = int(os.environ.get("AUDIT_FLUSH_BATCH", 200))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1.0))
+AUDIT_QUEUE_FULL_POLICY = os.environ.get("AUDIT_QUEUE_FULL_POLICY", "block")
+AUDIT_BLOCK_TIMEOUT = float(os.environ.get("AUDIT_BLOCK_TIMEOUT", 2.0))
+AUDIT_SPILL_FILE = os.path.abspath(os.environ.get("AUDIT_SPILL_FILE", "./audit_spill.jsonl"))
+
+AUDIT_COLUMNS = ["id", "action", "entity_type", "entity_id", "user_id",
+                 "user_name", "details", "ip_address", "timestamp"]
+
+
+class AuditWriter:
+    """Background writer that batches audit rows into multi-row INSERTs"""
+
+    def __init__(self, max_queue: int = AUDIT_QUEUE_MAX, batch_size: int = AUDIT_FLUSH_BATCH,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, full_policy: str = AUDIT_QUEUE_FULL_POLICY,
+                 block_timeout: float = AUDIT_BLOCK_TIMEOUT, spill_file: str = AUDIT_SPILL_FILE):
+        if full_policy not in ("block", "spill"):
+            raise ValueError(f"Unknown audit queue full policy: {full_policy}")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self.spill_file = spill_file
+
+        self._queue: "queue.Queue[Tuple]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self._replay_after = 0.0
+
+        self._enqueued = 0
+        self._written = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._max_depth = 0
+        self._last_batch_size = 0
+        self._flush_total_ms = 0.0
+        self._flush_max_ms = 0.0
+        self._flush_samples = deque(maxlen=500)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Tuple):
+        """Queue one audit row; applies the full-queue policy if the queue is at capacity"""
+        self._ensure_started()
+        try:
+            if self.full_policy == "block":
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self._spill([row])
+            return
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._enqueued += 1
+            self._max_depth = max(self._max_depth, depth)
+
+    def _drain(self, limit: int) -> List[Tuple]:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            batch = []
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                batch.extend(self._drain(self.batch_size - len(batch)))
+
+            if batch:
+                self._write_or_spill(batch)
+            elif time.monotonic() >= self._replay_after and (
+                    os.path.exists(self.spill_file) or os.path.exists(self.spill_file + ".replay")):
+                self._replay_spill()
+
+    def _write_batch(self, rows: List[Tuple]):
+        start = time.monotonic()
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            execute_values(
+                cur,
+                f"INSERT INTO audit_logs ({', '.join(AUDIT_COLUMNS)}) VALUES %s ON CONFLICT (id) DO NOTHING",
+                rows,
+                page_size=len(rows)
+            )
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        self._flushes += 1
+        self._written += len(rows)
+        self._last_batch_size = len(rows)
+        self._flush_total_ms += elapsed_ms
+        self._flush_max_ms = max(self._flush_max_ms, elapsed_ms)
+        self._flush_samples.append(elapsed_ms)
+
+    def _write_or_spill(self, rows: List[Tuple]):
+        with self._flush_lock:
+            try:
+                self._write_batch(rows)
+            except Exception as e:
+                self._flush_errors += 1
+                print(f"[audit] Flush error, spilling {len(rows)} event(s): {e}")
+                self._spill(rows)
+
+    def _spill(self, rows: List[Tuple]):
+        """Append rows to the local spill file for later replay"""
+        with self._spill_lock:
+            with open(self.spill_file, "a", encoding="utf-8") as f:
+                for row in rows:
+                    record = dict(zip(AUDIT_COLUMNS, row))
+                    record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._spilled += len(rows)
+
+    def _replay_spill(self):
+        """Move spilled rows back into the database in batches"""
+        replay_file = self.spill_file + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(replay_file):
+                if not os.path.exists(self.spill_file):
+                    return
+                os.replace(self.spill_file, replay_file)
+
+        rows = []
+        with open(replay_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record["timestamp"] = datetime.fromisoformat(record["timestamp"]) if record["timestamp"] else None
+                rows.append(tuple(record[c] for c in AUDIT_COLUMNS))
+
+        try:
+            with self._flush_lock:
+                for i in range(0, len(rows), self.batch_size):
+                    self._write_batch(rows[i:i + self.batch_size])
+            os.unlink(replay_file)
+            self._replayed += len(rows)
+            print(f"[audit] Replayed {len(rows)} spilled event(s)")
+        except Exception as e:
+            self._flush_errors += 1
+            self._replay_after = time.monotonic() + 30
+            print(f"[audit] Spill replay deferred: {e}")
+
+    def flush(self):
+        """Synchronously write everything currently queued"""
+        while True:
+            rows = self._drain(self.batch_size)
+            if not rows:
+                break
+            self._write_or_spill(rows)
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stop the background thread and durably flush the queue"""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self._flush_samples)
+        p95 = samples[math.ceil(len(samples) * 0.95) - 1] if samples else 0.0
+        with self._stats_lock:
+            enqueued, max_depth = self._enqueued, self._max_depth
+        return {
+            "queueDepth": self._queue.qsize(),
+            "maxQueueDepth": max_depth,
+            "queueCapacity": self._queue.maxsize,
+            "fullPolicy": self.full_policy,
+            "enqueued": enqueued,
+            "written": self._written,
+            "spilled": self._spilled,
+            "replayed": self._replayed,
+            "flushes": self._flushes,
+            "flushErrors": self._flush_errors,
+            "lastBatchSize": self._last_batch_size,
+            "flushLatencyMs": {
+                "avg": round(self._flush_total_ms / self._flushes, 3) if self._flushes else 0.0,
+                "p95": round(p95, 3),
+                "max": round(self._flush_max_ms, 3)
+            }
+        }
+
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.shutdown)
+
+
+def enqueue_audit_event(action: str, entity_type: str, entity_id: Optional[str] = None,
+                        user_id: str = "system", user_name: str = "System",
+                        details: Optional[Dict] = None, ip_address: Optional[str] = None,
+                        event_id: Optional[str] = None, timestamp: Optional[datetime] = None):
+    """Queue an audit event for the background writer"""
+    audit_writer.submit((
+        event_id or str(uuid.uuid4()),
+        action,
+        entity_type,
+        entity_id,
+        user_id,
+        user_name,
+        json.dumps(details) if details else None,
+        ip_address,
+        timestamp or datetime.now()
+    ))
+
+
+def get_audit_writer_stats() -> Dict[str, Any]:
+    return audit_writer.stats()
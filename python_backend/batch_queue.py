@@ -0,0 +1,202 @@
+"""
+Batch Queue Module - Postgres-backed work queue for batch job documents
+Each batch_job_items row is one queued document:
+- Claimed with FOR UPDATE SKIP LOCKED, so any number of workers can drain it
+- Claims are leases; a document held by a crashed worker is reclaimed once its lease expires
+- Failed documents are retried with exponential backoff up to a maximum attempt count
+- An expired lease on the last allowed attempt fails the document instead of reclaiming it
+- Job counters and final status are updated in the same transaction as the item
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from db import get_db_connection
+from audit_writer import enqueue_audit_event
+
+BATCH_MAX_ATTEMPTS = int(os.environ.get("BATCH_MAX_ATTEMPTS", 3))
+BATCH_RETRY_BASE_DELAY = float(os.environ.get("BATCH_RETRY_BASE_DELAY", 10))
+BATCH_LEASE_SECONDS = float(os.environ.get("BATCH_LEASE_SECONDS", 600))
+
+
+def claim_batch_items(worker_id: str, limit: int = 1, lease_seconds: float = BATCH_LEASE_SECONDS) -> List[Dict[str, Any]]:
+    """Lease up to `limit` runnable documents to this worker"""
+    fail_abandoned_items(lease_seconds)
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE batch_job_items i SET
+                status = 'processing',
+                attempts = i.attempts + 1,
+                locked_at = NOW(),
+                locked_by = %s
+            FROM (
+                SELECT batch_job_id, position
+                FROM batch_job_items
+                WHERE (status = 'pending' AND available_at <= NOW())
+                   OR (status = 'processing' AND attempts < %s
+                       AND locked_at < NOW() - make_interval(secs => %s))
+                ORDER BY available_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) claimed
+            WHERE i.batch_job_id = claimed.batch_job_id AND i.position = claimed.position
+            RETURNING i.batch_job_id, i.position, i.filename, i.document_hash, i.mime_type, i.attempts
+        """, (worker_id, BATCH_MAX_ATTEMPTS, lease_seconds, limit))
+        items = [dict(row) for row in cur.fetchall()]
+
+        if items:
+            cur.execute("""
+                UPDATE batch_jobs SET status = 'processing', started_at = COALESCE(started_at, NOW())
+                WHERE id = ANY(%s) AND status = 'pending'
+            """, (list({item["batch_job_id"] for item in items}),))
+        conn.commit()
+        cur.close()
+        return items
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def fail_abandoned_items(lease_seconds: float = BATCH_LEASE_SECONDS, limit: int = 100) -> int:
+    """Fail documents whose lease expired on their last allowed attempt.
+
+    A document that keeps crashing its worker never reports a result, so
+    reclaiming it would loop forever and its job would never finish.
+    Returns the number of documents failed.
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT batch_job_id, position, attempts
+            FROM batch_job_items
+            WHERE status = 'processing' AND attempts >= %s
+              AND locked_at < NOW() - make_interval(secs => %s)
+            ORDER BY available_at
+            LIMIT %s
+        """, (BATCH_MAX_ATTEMPTS, lease_seconds, limit))
+        abandoned = [dict(row) for row in cur.fetchall()]
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for item in abandoned:
+        record_batch_item_result(
+            item["batch_job_id"], item["position"], False,
+            error_message=f"Worker lease expired on attempt {item['attempts']} of {BATCH_MAX_ATTEMPTS}"
+        )
+    return len(abandoned)
+
+
+def retry_batch_item(job_id: str, position: int, attempts: int, error_message: Optional[str] = None) -> bool:
+    """Put a failed document back on the queue, or fail it for good once attempts run out.
+
+    Returns True if the document was rescheduled.
+    """
+    if attempts >= BATCH_MAX_ATTEMPTS:
+        record_batch_item_result(job_id, position, False, error_message=error_message)
+        return False
+
+    delay = BATCH_RETRY_BASE_DELAY * (2 ** (attempts - 1))
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE batch_job_items SET
+                status = 'pending',
+                available_at = NOW() + make_interval(secs => %s),
+                locked_at = NULL,
+                locked_by = NULL,
+                error_message = %s
+            WHERE batch_job_id = %s AND position = %s AND status = 'processing'
+        """, (delay, error_message, job_id, position))
+        conn.commit()
+        cur.close()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def record_batch_item_result(job_id: str, position: int, success: bool,
+                             verification_id: Optional[str] = None, error_message: Optional[str] = None):
+    """Mark one document finished and bump the job counters atomically.
+
+    An item that is already finished is left alone, so a document completed
+    twice (for example by a worker whose lease had expired) is counted once.
+    The job is finalized in the same transaction when its last document lands.
+    """
+    conn = get_db_connection()
+    finished = None
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE batch_job_items SET
+                status = %s,
+                verification_id = %s,
+                error_message = %s,
+                completed_at = NOW(),
+                locked_at = NULL,
+                locked_by = NULL
+            WHERE batch_job_id = %s AND position = %s AND status NOT IN ('succeeded', 'failed')
+            RETURNING position
+        """, ("succeeded" if success else "failed", verification_id, error_message, job_id, position))
+        if cur.fetchone():
+            cur.execute("""
+                UPDATE batch_jobs SET
+                    processed_documents = processed_documents + 1,
+                    successful_documents = successful_documents + %s,
+                    failed_documents = failed_documents + %s
+                WHERE id = %s
+                RETURNING processed_documents, total_documents
+            """, (1 if success else 0, 0 if success else 1, job_id))
+            counters = cur.fetchone()
+            if counters and counters["processed_documents"] >= counters["total_documents"]:
+                finished = _finalize_batch_job(cur, job_id)
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if finished:
+        enqueue_audit_event(
+            action="batch_job_completed",
+            entity_type="batch_job",
+            entity_id=job_id,
+            details={
+                "name": finished["name"],
+                "status": finished["status"],
+                "successful": finished["successful_documents"],
+                "failed": finished["failed_documents"]
+            }
+        )
+
+
+def _finalize_batch_job(cur, job_id: str) -> Optional[Dict[str, Any]]:
+    """Set a batch job's final status from its counters (once)"""
+    cur.execute("""
+        UPDATE batch_jobs SET
+            status = CASE
+                WHEN failed_documents = 0 THEN 'completed'
+                WHEN successful_documents > 0 THEN 'completed_with_errors'
+                ELSE 'failed'
+            END,
+            completed_at = NOW()
+        WHERE id = %s AND completed_at IS NULL
+        RETURNING name, status, successful_documents, failed_documents
+    """, (job_id,))
+    return cur.fetchone()
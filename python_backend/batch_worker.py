@@ -0,0 +1,95 @@
+"""
+Batch Worker - Drains queued batch job documents
+Runs separately from the API server; start as many as throughput needs:
+    python python_backend/batch_worker.py
+- Each process runs BATCH_WORKER_THREADS threads, each claiming up to OCR_PACK_MAX_IMAGES documents
+  at a time so their OCR can share Vision requests
+- Idle threads poll the queue every BATCH_POLL_INTERVAL seconds
+- SIGTERM/SIGINT stop claiming new work and let in-flight documents finish
+"""
+
+import os
+import sys
+import signal
+import socket
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import process_documents_for_batch
+from batch_queue import claim_batch_items, retry_batch_item, record_batch_item_result
+from ocr_packing import OCR_PACK_MAX_IMAGES
+
+BATCH_WORKER_THREADS = max(int(os.environ.get("BATCH_WORKER_THREADS", 4)), 1)
+BATCH_POLL_INTERVAL = float(os.environ.get("BATCH_POLL_INTERVAL", 2.0))
+
+stop_event = threading.Event()
+
+
+def process_items(items):
+    try:
+        results = process_documents_for_batch(items)
+    except Exception as e:
+        results = [{"success": False, "error": str(e)}] * len(items)
+
+    for item, result in zip(items, results):
+        try:
+            finish_item(item, result)
+        except Exception as e:
+            # The lease expires and another worker picks the document up again
+            print(f"[worker] Error finishing {item['batch_job_id']}#{item['position']}: {e}")
+
+
+def finish_item(item, result):
+    job_id, position = item["batch_job_id"], item["position"]
+    if result["success"]:
+        record_batch_item_result(job_id, position, True, result["verification_id"])
+        print(f"[worker] {job_id}#{position} done ({result['status']})")
+    elif retry_batch_item(job_id, position, item["attempts"], result.get("error")):
+        print(f"[worker] {job_id}#{position} attempt {item['attempts']} failed, retrying: {result.get('error')}")
+    else:
+        print(f"[worker] {job_id}#{position} failed after {item['attempts']} attempt(s): {result.get('error')}")
+
+
+def worker_loop(worker_id):
+    while not stop_event.is_set():
+        try:
+            items = claim_batch_items(worker_id, limit=OCR_PACK_MAX_IMAGES)
+        except Exception as e:
+            print(f"[worker] Claim error: {e}")
+            items = []
+
+        if not items:
+            stop_event.wait(BATCH_POLL_INTERVAL)
+            continue
+
+        process_items(items)
+
+
+def main():
+    def handle_stop(signum, frame):
+        print("[worker] Shutting down after in-flight documents")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{prefix}:{i}",), name=f"batch-worker-{i}")
+        for i in range(BATCH_WORKER_THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"[worker] Started {len(threads)} thread(s) as {prefix}")
+
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1.0)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
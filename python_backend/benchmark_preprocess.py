@@ -0,0 +1,114 @@
+"""
+Preprocess Benchmark - Compares Vision payloads with and without preprocessing
+For each document, reports the original and preprocessed payload sizes
+(as sent, base64-encoded) and the time spent in each preprocessing step.
+With --ocr it also times a real Vision call on both versions, which needs
+a working OpenAI API key and costs two requests per document.
+
+Usage:
+    python python_backend/benchmark_preprocess.py [files ...] [--synthetic 3] [--ocr] [--json out.json]
+"""
+
+import io
+import sys
+import json
+import time
+import argparse
+
+from PIL import Image, ImageDraw
+
+from image_preprocess import preprocess_document
+
+
+def synthetic_photo(index: int) -> bytes:
+    """A phone-camera sized JPEG with sensor-like noise and a rotated EXIF orientation"""
+    size = (4032, 3024)
+    image = Image.merge("RGB", [Image.effect_noise(size, 40 + index * 5) for _ in range(3)])
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([400, 400, 3600, 2600], outline=(255, 255, 255), width=12)
+    for line in range(12):
+        draw.text((600, 600 + line * 150), f"SAMPLE DOCUMENT LINE {line} 0123456789", fill=(0, 0, 0))
+
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def base64_size(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def time_ocr(images, doc_type: str):
+    from app import extract_ocr_with_vision
+
+    start = time.perf_counter()
+    result = extract_ocr_with_vision(images, doc_type)
+    return round((time.perf_counter() - start) * 1000, 1), result is not None
+
+
+def run(documents, with_ocr: bool):
+    results = []
+    for name, content, mime_type in documents:
+        prepared = preprocess_document(content, mime_type)
+        entry = {
+            "document": name,
+            "originalBytes": prepared["originalBytes"],
+            "processedBytes": prepared["processedBytes"],
+            "originalPayloadBytes": base64_size(prepared["originalBytes"]),
+            "processedPayloadBytes": sum(base64_size(len(data)) for data, _ in prepared["images"]),
+            "bytesSaved": prepared["bytesSaved"],
+            "pages": len(prepared["images"]),
+            "passthrough": prepared["passthrough"],
+            "preprocessMs": round(sum(prepared["timingsMs"].values()), 2),
+            "stepsMs": prepared["timingsMs"]
+        }
+        if with_ocr:
+            entry["ocrOriginalMs"], entry["ocrOriginalOk"] = time_ocr([(content, mime_type)], "national_id")
+            entry["ocrProcessedMs"], entry["ocrProcessedOk"] = time_ocr(prepared["images"], "national_id")
+        results.append(entry)
+
+        saved = 100 * entry["bytesSaved"] / entry["originalBytes"] if entry["originalBytes"] else 0
+        line = (f"[bench] {name}: {entry['originalPayloadBytes']} -> {entry['processedPayloadBytes']} payload bytes "
+                f"({saved:.1f}% smaller), preprocess {entry['preprocessMs']} ms {entry['stepsMs']}")
+        if with_ocr:
+            line += f", OCR {entry['ocrOriginalMs']} -> {entry['ocrProcessedMs']} ms"
+        print(line)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Vision payload size and latency with and without preprocessing")
+    parser.add_argument("files", nargs="*", help="Image or PDF files to benchmark")
+    parser.add_argument("--synthetic", type=int, default=3, help="Synthetic phone photos to add when no files are given")
+    parser.add_argument("--ocr", action="store_true", help="Also time real Vision calls on both payloads")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    documents = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            content = f.read()
+        mime_type = "application/pdf" if path.lower().endswith(".pdf") else (
+            "image/png" if path.lower().endswith(".png") else "image/jpeg")
+        documents.append((path, content, mime_type))
+    if not documents:
+        documents = [(f"synthetic-{i}.jpg", synthetic_photo(i), "image/jpeg") for i in range(args.synthetic)]
+
+    results = run(documents, args.ocr)
+
+    original = sum(r["originalPayloadBytes"] for r in results)
+    processed = sum(r["processedPayloadBytes"] for r in results)
+    print(f"[bench] Total payload {original} -> {processed} bytes "
+          f"({100 * (original - processed) / original if original else 0:.1f}% smaller)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"documents": results, "totalOriginalPayloadBytes": original,
+                       "totalProcessedPayloadBytes": processed}, f, indent=2)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Blob Store Module - Content-addressed storage for uploaded documents
+Documents are written once under their SHA-256 digest and deduplicated:
+- <root>/<first two hex chars>/<full digest>
+- Atomic writes via temp file + rename
+- Content type sniffed from magic bytes when serving
+"""
+
+import os
+import re
+import hashlib
+import tempfile
+from typing import BinaryIO
+
+BLOB_STORE_DIR = os.path.abspath(os.environ.get("BLOB_STORE_DIR", "./document_store"))
+
+CHUNK_SIZE = 1024 * 1024
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_MAGIC_TYPES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF", "application/pdf"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def is_valid_digest(digest: str) -> bool:
+    """Check that a digest is a lowercase SHA-256 hex string"""
+    return bool(digest) and bool(_DIGEST_RE.match(digest))
+
+
+def blob_path(digest: str) -> str:
+    """Filesystem path for a digest"""
+    if not is_valid_digest(digest):
+        raise ValueError(f"Invalid blob digest: {digest!r}")
+    return os.path.join(BLOB_STORE_DIR, digest[:2], digest)
+
+
+def blob_exists(digest: str) -> bool:
+    return is_valid_digest(digest) and os.path.exists(blob_path(digest))
+
+
+def put_stream(stream: BinaryIO) -> str:
+    """Hash and store a stream chunk by chunk, returning its SHA-256 digest"""
+    os.makedirs(BLOB_STORE_DIR, exist_ok=True)
+    hasher = hashlib.sha256()
+
+    fd, tmp_path = tempfile.mkstemp(dir=BLOB_STORE_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                tmp.write(chunk)
+
+        digest = hasher.hexdigest()
+        final_path = blob_path(digest)
+        if os.path.exists(final_path):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return digest
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def sniff_content_type(digest: str) -> str:
+    """Guess a blob's content type from its leading bytes"""
+    with open(blob_path(digest), "rb") as f:
+        head = f.read(16)
+    for magic, content_type in _MAGIC_TYPES:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def document_url_for(digest: str) -> str:
+    """API URL that streams a stored document"""
+    return f"/api/documents/{digest}"
@@ -0,0 +1,139 @@
+"""
+Query Plan Check - Guards hot queries against sequential scans
+Seeds a large synthetic dataset inside a transaction, runs EXPLAIN on each
+hot query path and exits non-zero if any of them plans a Seq Scan on its
+target table. The transaction is rolled back, so the database is unchanged.
+
+Usage:
+    python python_backend/check_query_plans.py [--rows 200000]
+"""
+
+import sys
+import json
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db import get_db_connection
+from migrations import run_migrations
+
+HOT_QUERIES = [
+    ("verifications page", "verifications",
+     "SELECT * FROM verifications ORDER BY submitted_at DESC NULLS FIRST, id DESC LIMIT 50", []),
+    ("verifications keyset page", "verifications",
+     "SELECT * FROM verifications WHERE (submitted_at, id) < (NOW() - INTERVAL '100 days', 'zzz') "
+     "ORDER BY submitted_at DESC NULLS FIRST, id DESC LIMIT 50", []),
+    ("verifications by status", "verifications",
+     "SELECT * FROM verifications WHERE status = ANY(%s) "
+     "ORDER BY submitted_at DESC NULLS FIRST, id DESC LIMIT 50", [["pending"]]),
+    ("chat history", "chat_messages",
+     "SELECT id, role, content, timestamp FROM chat_messages WHERE verification_id = %s "
+     "ORDER BY timestamp ASC", ["seed-ver-42"]),
+    ("audit logs page", "audit_logs",
+     "SELECT * FROM audit_logs ORDER BY timestamp DESC, id DESC LIMIT 50", []),
+    ("audit logs by action", "audit_logs",
+     "SELECT * FROM audit_logs WHERE action = %s ORDER BY timestamp DESC, id DESC LIMIT 50", ["action_3"]),
+    ("audit logs by entity type", "audit_logs",
+     "SELECT * FROM audit_logs WHERE entity_type = %s ORDER BY timestamp DESC, id DESC LIMIT 50", ["entity_2"]),
+    ("audit logs by entity id", "audit_logs",
+     "SELECT * FROM audit_logs WHERE entity_id = %s ORDER BY timestamp DESC, id DESC LIMIT 50", ["seed-ver-42"]),
+    ("audit logs by user", "audit_logs",
+     "SELECT * FROM audit_logs WHERE user_id = %s ORDER BY timestamp DESC, id DESC LIMIT 50", ["user_7"]),
+    ("audit logs keyset page", "audit_logs",
+     "SELECT * FROM audit_logs WHERE (timestamp, id) < (NOW() - INTERVAL '1 day', 'zzz') "
+     "ORDER BY timestamp DESC, id DESC LIMIT 50", []),
+    ("audit logs by date range", "audit_logs",
+     "SELECT * FROM audit_logs WHERE timestamp >= NOW() - INTERVAL '1 day' "
+     "ORDER BY timestamp DESC, id DESC LIMIT 50", []),
+    ("batch jobs page", "batch_jobs",
+     "SELECT * FROM batch_jobs ORDER BY created_at DESC LIMIT 50", []),
+]
+
+
+def seed(cur, rows: int):
+    """Insert synthetic rows with realistic cardinalities"""
+    cur.execute("""
+        INSERT INTO verifications (id, document_type, status, risk_score, risk_level,
+                                   customer_name, submitted_at)
+        SELECT 'seed-ver-' || g,
+               (ARRAY['passport', 'drivers_license', 'national_id'])[1 + mod(g, 3)],
+               (ARRAY['approved', 'rejected', 'pending', 'in_review'])[1 + mod(g, 4)],
+               mod(g, 100),
+               (ARRAY['low', 'medium', 'high'])[1 + mod(g, 3)],
+               'Customer ' || g,
+               NOW() - (g || ' minutes')::interval
+        FROM generate_series(1, %s) g
+    """, (rows,))
+    cur.execute("""
+        INSERT INTO chat_messages (id, verification_id, role, content, timestamp)
+        SELECT 'seed-msg-' || g, 'seed-ver-' || (1 + mod(g, %s)), 'user', 'hello',
+               NOW() - (g || ' seconds')::interval
+        FROM generate_series(1, %s) g
+    """, (rows, rows))
+    cur.execute("""
+        INSERT INTO audit_logs (id, action, entity_type, entity_id, user_id, user_name, timestamp)
+        SELECT 'seed-log-' || g, 'action_' || mod(g, 12), 'entity_' || mod(g, 5),
+               'seed-ver-' || (1 + mod(g, %s)), 'user_' || mod(g, 50), 'User',
+               NOW() - (g || ' seconds')::interval
+        FROM generate_series(1, %s) g
+    """, (rows, rows * 2))
+    cur.execute("""
+        INSERT INTO batch_jobs (id, name, created_at)
+        SELECT 'seed-job-' || g, 'Batch ' || g, NOW() - (g || ' minutes')::interval
+        FROM generate_series(1, %s) g
+    """, (max(rows // 10, 1),))
+    for table in ["verifications", "chat_messages", "audit_logs", "batch_jobs"]:
+        cur.execute(f"ANALYZE {table}")
+
+
+def find_seq_scans(plan: dict, table: str) -> list:
+    """Collect Seq Scan nodes on the given table anywhere in a JSON plan"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == table:
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child, table))
+    return found
+
+
+def check_plans(rows: int) -> bool:
+    run_migrations()
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    ok = True
+    try:
+        print(f"[plans] Seeding {rows} rows per table (rolled back afterwards)")
+        seed(cur, rows)
+
+        for name, table, query, params in HOT_QUERIES:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+            plan = cur.fetchone()["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            seq_scans = find_seq_scans(plan[0]["Plan"], table)
+            if seq_scans:
+                ok = False
+                print(f"[plans] FAIL {name}: Seq Scan on {table}")
+            else:
+                print(f"[plans] ok   {name}")
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if hot queries regress to sequential scans")
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic rows to seed per table")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_plans(args.rows) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Database Module - Pooled PostgreSQL connections
+Provides a thread-safe connection pool shared by every database helper:
+- Configurable min/max pool size
+- Health checks on checkout
+- Per-request connection borrowing for Flask handlers, handed back before slow external calls
+- Pool metrics (in use, waiting, checkout latency)
+"""
+
+import os
+import math
+import time
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_HEALTHCHECK_IDLE = float(os.environ.get("DB_POOL_HEALTHCHECK_IDLE", 30))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class PooledConnection:
+    """Proxy around a psycopg2 connection whose close() hands it back to the pool"""
+
+    def __init__(self, pool: "ConnectionPool", conn, request_scoped: bool = False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def close(self):
+        """Return the connection to the pool (request-scoped handles only reset)"""
+        if self._released:
+            return
+        if self._request_scoped:
+            self._pool.reset(self._conn)
+            return
+        self._released = True
+        self._pool.putconn(self._conn)
+
+    def release(self):
+        """Return the connection to the pool regardless of scope"""
+        if self._released:
+            return
+        self._released = True
+        self._pool.putconn(self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
+        self.close()
+
+
+class ConnectionPool:
+    """Blocking, thread-safe pool of psycopg2 connections"""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 timeout: float = 30, healthcheck_idle: float = 30):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size must be <= max_size and max_size >= 1")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = 0
+        self._waiting = 0
+        self._opened = 0
+        self._pid = os.getpid()
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._checkout_total_ms = 0.0
+        self._checkout_max_ms = 0.0
+        self._checkout_samples = deque(maxlen=1000)
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            self.dsn,
+            cursor_factory=RealDictCursor,
+            sslmode="require"
+        )
+        with self._cond:
+            self._opened += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:
+            self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _check_fork(self):
+        """Drop connections inherited from a parent process"""
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._in_use = 0
+            self._waiting = 0
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """Borrow a healthy connection, blocking up to the pool timeout"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            self._check_fork()
+            while True:
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use + len(self._idle) < self.max_size:
+                    self._in_use += 1
+                    conn, idle_since = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_total_ms += elapsed_ms
+            self._checkout_max_ms = max(self._checkout_max_ms, elapsed_ms)
+            self._checkout_samples.append(elapsed_ms)
+
+        return conn
+
+    def reset(self, conn):
+        """Roll back any transaction left open on a borrowed connection"""
+        if conn.closed:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            pass
+
+    def putconn(self, conn):
+        """Return a borrowed connection to the pool"""
+        self.reset(conn)
+        keep = not conn.closed and \
+            conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+        with self._cond:
+            if os.getpid() != self._pid:
+                return
+            self._in_use = max(self._in_use - 1, 0)
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if not keep:
+            self._discard(conn)
+
+    def closeall(self):
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool usage and checkout latency"""
+        with self._cond:
+            samples = sorted(self._checkout_samples)
+            p95 = samples[math.ceil(len(samples) * 0.95) - 1] if samples else 0.0
+            return {
+                "minSize": self.min_size,
+                "maxSize": self.max_size,
+                "inUse": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "opened": self._opened,
+                "discarded": self._discarded,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "checkoutLatencyMs": {
+                    "avg": round(self._checkout_total_ms / self._checkouts, 3) if self._checkouts else 0.0,
+                    "p95": round(p95, 3),
+                    "max": round(self._checkout_max_ms, 3)
+                }
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE
+                )
+    return _pool
+
+
+def get_db_connection() -> PooledConnection:
+    """Borrow a pooled connection.
+
+    Inside a Flask request the same connection is reused by every helper and
+    returned to the pool at teardown; elsewhere close() returns it immediately.
+    """
+    from flask import g, has_app_context
+
+    pool = get_pool()
+
+    if has_app_context():
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = PooledConnection(pool, pool.getconn(), request_scoped=True)
+            g._db_conn = conn
+        return conn
+
+    return PooledConnection(pool, pool.getconn())
+
+
+def open_dedicated_connection():
+    """Open an unpooled connection for long-lived uses such as LISTEN"""
+    return psycopg2.connect(
+        DATABASE_URL,
+        cursor_factory=RealDictCursor,
+        sslmode="require"
+    )
+
+
+def borrow_connection() -> PooledConnection:
+    """Borrow a dedicated pooled connection, independent of any request scope.
+
+    Use for work that outlives the request's app context, such as streamed
+    responses and background threads. close() returns it to the pool.
+    """
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
+
+
+def release_request_connection(exc=None):
+    """Flask teardown hook: return the request's connection to the pool"""
+    from flask import g
+
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        conn.release()
+
+
+def yield_request_connection():
+    """Hand the request's connection back to the pool before slow external work.
+
+    Helpers commit before they close, so nothing is pending between them; the
+    next get_db_connection() in the same request borrows a connection again.
+    Without this a request would hold its connection through OpenAI calls and
+    DB_POOL_MAX_SIZE slow requests would starve everything else.
+    """
+    from flask import has_app_context
+
+    if has_app_context():
+        release_request_connection()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool metrics, or an empty snapshot before the pool exists"""
+    if _pool is None:
+        return {"inUse": 0, "idle": 0, "waiting": 0, "checkouts": 0}
+    return _pool.stats()
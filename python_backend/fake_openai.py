@@ -0,0 +1,327 @@
+"""
+Fake OpenAI Server - Local stand-in for the OpenAI API used in load tests
+Speaks just enough of the REST API for the backend and LangChain clients:
+- POST /v1/chat/completions: canned OCR JSON for Vision requests (an array for packed
+  batch requests), canned text otherwise
+- POST /v1/embeddings: deterministic unit vectors (float or base64 encoding)
+- Latency drawn per request from a fixed, uniform or lognormal distribution
+- Injected 5xx errors and 429s (with retry-after-ms) at configurable rates
+- GET /_stats: request, error and latency counters
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python python_backend/fake_openai.py [--port 9100] [--vision-latency-ms 2500] [--error-rate 0.01]
+                                         [--throttle-rate 0.02] [--payloads payloads.json]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import array
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+EMBEDDING_DIMENSIONS = 1536
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "distribution": "lognormal",
+    "visionLatencyMs": 2500.0,
+    "chatLatencyMs": 800.0,
+    "embeddingLatencyMs": 120.0,
+    "latencySigma": 0.35,
+    "errorRate": 0.0,
+    "throttleRate": 0.0,
+    "retryAfterMs": 500,
+    "seed": None,
+    "payloads": {
+        "vision": {
+            "extracted_fields": [
+                {"fieldName": "Full Name", "value": "JANE SAMPLE", "confidence": 96},
+                {"fieldName": "Document Number", "value": "X1234567", "confidence": 97},
+                {"fieldName": "Date of Birth", "value": "1990-04-12", "confidence": 93},
+                {"fieldName": "Expiry Date", "value": "2031-04-11", "confidence": 91},
+                {"fieldName": "Issuing Country", "value": "United Kingdom", "confidence": 89}
+            ],
+            "document_analysis": {
+                "detected_type": "passport",
+                "quality_score": 88,
+                "is_readable": True,
+                "potential_issues": []
+            }
+        },
+        "chat": "The extracted fields are consistent and the risk score is low; this document can be approved."
+    }
+}
+
+
+class FakeOpenAIState:
+    """Configuration plus thread-safe counters shared by all handler threads"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.random = random.Random(config.get("seed"))
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, float]] = {}
+
+    def latency_seconds(self, kind: str) -> float:
+        median_ms = self.config[f"{kind}LatencyMs"]
+        distribution = self.config["distribution"]
+        with self._lock:
+            if distribution == "fixed":
+                ms = median_ms
+            elif distribution == "uniform":
+                ms = self.random.uniform(0.5 * median_ms, 1.5 * median_ms)
+            else:
+                ms = median_ms * math.exp(self.random.gauss(0, self.config["latencySigma"]))
+        return ms / 1000
+
+    def injected_failure(self) -> int:
+        """0 for a normal response, otherwise the status code to fail with"""
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.config["throttleRate"]:
+            return 429
+        if roll < self.config["throttleRate"] + self.config["errorRate"]:
+            return 500
+        return 0
+
+    def record(self, kind: str, status: int, ms: float):
+        with self._lock:
+            entry = self.counters.setdefault(kind, {"requests": 0, "errors": 0, "throttled": 0, "totalMs": 0.0})
+            entry["requests"] += 1
+            entry["errors"] += 1 if status >= 500 else 0
+            entry["throttled"] += 1 if status == 429 else 0
+            entry["totalMs"] += ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                kind: {**entry, "totalMs": round(entry["totalMs"], 1),
+                       "avgMs": round(entry["totalMs"] / entry["requests"], 1) if entry["requests"] else 0.0}
+                for kind, entry in self.counters.items()
+            }
+
+
+def _approx_tokens(value: Any) -> int:
+    return max(1, len(json.dumps(value)) // 4)
+
+
+def _is_vision_request(messages: List[Dict[str, Any]]) -> bool:
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+            return True
+    return False
+
+
+def _count_images(messages: List[Dict[str, Any]]) -> int:
+    return sum(
+        1
+        for message in messages if isinstance(message.get("content"), list)
+        for part in message["content"] if part.get("type") == "image_url"
+    )
+
+
+def fake_embedding(item: Any, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Deterministic unit vector for an input string (or token list)"""
+    seed = int.from_bytes(hashlib.sha256(json.dumps(item).encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def chat_completion(state: FakeOpenAIState, body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    messages = body.get("messages", [])
+    if _is_vision_request(messages):
+        kind = "vision"
+        images = _count_images(messages)
+        if images > 1 and "JSON array" in json.dumps(messages):
+            # Packed batch request: one result per image
+            content = json.dumps([{"image": n, **state.config["payloads"]["vision"]} for n in range(1, images + 1)])
+        else:
+            content = json.dumps(state.config["payloads"]["vision"])
+        # Text prompt plus the high-detail image estimate the real API would bill
+        prompt_tokens = _approx_tokens([m.get("content") for m in messages if isinstance(m.get("content"), str)])
+        prompt_tokens += 1445 * _count_images(messages)
+    else:
+        kind = "chat"
+        content = state.config["payloads"]["chat"]
+        prompt_tokens = _approx_tokens(messages)
+    completion_tokens = _approx_tokens(content)
+    return kind, {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def embeddings(body: Dict[str, Any]) -> Dict[str, Any]:
+    inputs = body.get("input", [])
+    # A single string, a single token list, or a list of either
+    if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS
+    data = []
+    for index, item in enumerate(inputs):
+        vector = fake_embedding(item, dimensions)
+        if body.get("encoding_format") == "base64":
+            encoded = base64.b64encode(array.array("f", vector).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": encoded})
+        else:
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+    tokens = sum(_approx_tokens(item) for item in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    }
+
+
+def make_handler(state: FakeOpenAIState):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                self._send_json(200, state.stats())
+            elif self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [
+                    {"id": "gpt-4o", "object": "model"}, {"id": "text-embedding-3-small", "object": "model"}
+                ]})
+            else:
+                self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            start = time.perf_counter()
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+                return
+
+            path = self.path.split("?")[0].rstrip("/")
+            if path.endswith("/chat/completions"):
+                kind, payload = chat_completion(state, body)
+            elif path.endswith("/embeddings"):
+                kind, payload = "embedding", embeddings(body)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                return
+
+            status = state.injected_failure()
+            # Real 429s come back immediately; everything else pays the model latency
+            if status != 429:
+                time.sleep(state.latency_seconds(kind))
+            if status == 429:
+                self._send_json(429, {"error": {"message": "Rate limit reached (injected)", "type": "requests"}},
+                                {"retry-after-ms": str(state.config["retryAfterMs"])})
+            elif status:
+                self._send_json(status, {"error": {"message": "Server error (injected)", "type": "server_error"}})
+            else:
+                self._send_json(200, payload)
+            state.record(kind, status or 200, (time.perf_counter() - start) * 1000)
+
+    return FakeOpenAIHandler
+
+
+def start_fake_openai(host: str = "127.0.0.1", port: int = 0,
+                      config: Dict[str, Any] = None) -> Tuple[ThreadingHTTPServer, FakeOpenAIState]:
+    """Start the fake server on a background thread; port 0 picks a free port"""
+    merged = {**DEFAULT_CONFIG, **(config or {})}
+    merged["payloads"] = {**DEFAULT_CONFIG["payloads"], **((config or {}).get("payloads") or {})}
+    state = FakeOpenAIState(merged)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, state
+
+
+def parse_config_args(parser: argparse.ArgumentParser):
+    """Latency and failure flags shared with the load benchmark"""
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--vision-latency-ms", type=float, default=DEFAULT_CONFIG["visionLatencyMs"])
+    parser.add_argument("--chat-latency-ms", type=float, default=DEFAULT_CONFIG["chatLatencyMs"])
+    parser.add_argument("--embedding-latency-ms", type=float, default=DEFAULT_CONFIG["embeddingLatencyMs"])
+    parser.add_argument("--latency-sigma", type=float, default=DEFAULT_CONFIG["latencySigma"],
+                        help="Spread of the lognormal distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after-ms", type=int, default=DEFAULT_CONFIG["retryAfterMs"])
+    parser.add_argument("--seed", type=int, help="Seed for latency and failure sampling")
+    parser.add_argument("--payloads", help="JSON file with 'vision' (object) and/or 'chat' (string) responses")
+
+
+def config_from_args(args) -> Dict[str, Any]:
+    payloads = {}
+    if args.payloads:
+        with open(args.payloads, encoding="utf-8") as f:
+            payloads = json.load(f)
+    return {
+        "distribution": args.distribution,
+        "visionLatencyMs": args.vision_latency_ms,
+        "chatLatencyMs": args.chat_latency_ms,
+        "embeddingLatencyMs": args.embedding_latency_ms,
+        "latencySigma": args.latency_sigma,
+        "errorRate": args.error_rate,
+        "throttleRate": args.throttle_rate,
+        "retryAfterMs": args.retry_after_ms,
+        "seed": args.seed,
+        "payloads": payloads
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI API for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FAKE_OPENAI_PORT", 9100)))
+    parse_config_args(parser)
+    args = parser.parse_args()
+
+    server, _ = start_fake_openai(args.host, args.port, config_from_args(args))
+    print(f"[fake-openai] Listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Image Preprocess Module - Shrink documents before they are sent to Vision
+gpt-4o never looks at more than 2048px on the long side and 768px on the
+short side in high-detail mode, so anything larger only costs upload time
+and request size:
+- Decode and apply EXIF orientation
+- Downscale to the resolution the model actually uses
+- Recompress as JPEG (PNG kept when the image has transparency)
+- Rasterize PDFs page by page with pypdfium2
+- Reads straight from a file path, so the original never has to sit in memory whole
+- Per-step timings and bytes saved, per call and in aggregate
+"""
+
+import io
+import os
+import time
+import threading
+from typing import Any, Dict, List, Tuple, Union
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import pypdfium2
+    PDF_RASTER_AVAILABLE = True
+except ImportError:
+    PDF_RASTER_AVAILABLE = False
+
+PREPROCESS_ENABLED = os.environ.get("OCR_PREPROCESS_ENABLED", "true").lower() != "false"
+PREPROCESS_MAX_LONG_SIDE = int(os.environ.get("OCR_MAX_LONG_SIDE", 2048))
+PREPROCESS_MAX_SHORT_SIDE = int(os.environ.get("OCR_MAX_SHORT_SIDE", 768))
+PREPROCESS_JPEG_QUALITY = int(os.environ.get("OCR_JPEG_QUALITY", 85))
+PREPROCESS_PDF_MAX_PAGES = int(os.environ.get("OCR_PDF_MAX_PAGES", 4))
+PREPROCESS_PDF_DPI = int(os.environ.get("OCR_PDF_DPI", 150))
+
+_stats_lock = threading.Lock()
+_stats = {
+    "documents": 0,
+    "pages": 0,
+    "passthrough": 0,
+    "errors": 0,
+    "originalBytes": 0,
+    "processedBytes": 0,
+    "stepMs": {}
+}
+
+
+def target_size(width: int, height: int, max_long: int = PREPROCESS_MAX_LONG_SIDE,
+                max_short: int = PREPROCESS_MAX_SHORT_SIDE) -> Tuple[int, int]:
+    """Largest size within both limits that keeps the aspect ratio"""
+    long_side, short_side = max(width, height), min(width, height)
+    scale = min(1.0, max_long / long_side, max_short / short_side)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode(image) -> Tuple[bytes, str]:
+    buffer = io.BytesIO()
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), "image/png"
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(buffer, format="JPEG", quality=PREPROCESS_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def _shrink(image, timings: Dict[str, float]) -> Tuple[bytes, str]:
+    start = time.perf_counter()
+    image = ImageOps.exif_transpose(image)
+    timings["orient"] = timings.get("orient", 0.0) + (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    size = target_size(*image.size)
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+    timings["resize"] = timings.get("resize", 0.0) + (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    data, mime_type = _encode(image)
+    timings["encode"] = timings.get("encode", 0.0) + (time.perf_counter() - start) * 1000
+    return data, mime_type
+
+
+def _rasterize_pdf(content: Union[bytes, str], timings: Dict[str, float]) -> List[Tuple[bytes, str]]:
+    start = time.perf_counter()
+    pdf = pypdfium2.PdfDocument(content)
+    try:
+        pages = []
+        for index in range(min(len(pdf), PREPROCESS_PDF_MAX_PAGES)):
+            pages.append(pdf[index].render(scale=PREPROCESS_PDF_DPI / 72).to_pil())
+    finally:
+        pdf.close()
+    timings["rasterize"] = (time.perf_counter() - start) * 1000
+    return [_shrink(page, timings) for page in pages]
+
+
+def _read_all(source: Union[bytes, str]) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _read_head(source: Union[bytes, str]) -> bytes:
+    if isinstance(source, bytes):
+        return source[:5]
+    with open(source, "rb") as f:
+        return f.read(5)
+
+
+def preprocess_document(source: Union[bytes, str], mime_type: str) -> Dict[str, Any]:
+    """Turn an uploaded document (bytes or a file path) into the images to send to Vision.
+
+    Returns {"images": [(bytes, mime_type), ...], "timingsMs", "originalBytes",
+    "processedBytes", "bytesSaved", "passthrough"}. Anything that cannot be
+    processed is passed through unchanged.
+    """
+    timings: Dict[str, float] = {}
+    images = None
+    passthrough = True
+    original_bytes = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+    try:
+        is_pdf = mime_type == "application/pdf" or _read_head(source) == b"%PDF-"
+        if PREPROCESS_ENABLED and PIL_AVAILABLE:
+            if is_pdf and PDF_RASTER_AVAILABLE:
+                images = _rasterize_pdf(source, timings)
+                passthrough = False
+            elif not is_pdf:
+                start = time.perf_counter()
+                image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+                if image.format == "JPEG":
+                    # Let the JPEG decoder downscale by a power of two while decoding
+                    image.draft("RGB", target_size(*image.size))
+                image.load()
+                timings["decode"] = (time.perf_counter() - start) * 1000
+                data, processed_type = _shrink(image, timings)
+                image.close()
+                # Small images that are already within limits can come out larger after re-encoding
+                if len(data) < original_bytes:
+                    images = [(data, processed_type)]
+                    passthrough = False
+    except Exception as e:
+        print(f"[preprocess] Falling back to original document: {e}")
+        with _stats_lock:
+            _stats["errors"] += 1
+        images = None
+        passthrough = True
+
+    if images is None:
+        images = [(_read_all(source), mime_type)]
+
+    processed_bytes = sum(len(data) for data, _ in images)
+    timings = {step: round(ms, 2) for step, ms in timings.items()}
+
+    with _stats_lock:
+        _stats["documents"] += 1
+        _stats["pages"] += len(images)
+        _stats["passthrough"] += 1 if passthrough else 0
+        _stats["originalBytes"] += original_bytes
+        _stats["processedBytes"] += processed_bytes
+        for step, ms in timings.items():
+            _stats["stepMs"][step] = _stats["stepMs"].get(step, 0.0) + ms
+
+    return {
+        "images": images,
+        "timingsMs": timings,
+        "originalBytes": original_bytes,
+        "processedBytes": processed_bytes,
+        "bytesSaved": original_bytes - processed_bytes,
+        "passthrough": passthrough
+    }
+
+
+def get_preprocess_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        documents = _stats["documents"]
+        return {
+            "enabled": PREPROCESS_ENABLED and PIL_AVAILABLE,
+            "pdfRasterization": PDF_RASTER_AVAILABLE,
+            "documents": documents,
+            "pages": _stats["pages"],
+            "passthrough": _stats["passthrough"],
+            "errors": _stats["errors"],
+            "originalBytes": _stats["originalBytes"],
+            "processedBytes": _stats["processedBytes"],
+            "bytesSaved": _stats["originalBytes"] - _stats["processedBytes"],
+            "avgStepMs": {
+                step: round(total / documents, 2) for step, total in _stats["stepMs"].items()
+            } if documents else {}
+        }
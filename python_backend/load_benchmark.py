@@ -0,0 +1,364 @@
+"""
+Load Benchmark - Throughput and latency of the backend API under concurrency
+Drives the real Flask server over HTTP, scenario by scenario and at each
+concurrency level, and reports throughput and p50/p95/p99 latency:
+- verifications: POST /api/verifications with a unique small JPEG per request
+- batch: POST /api/batch-jobs (submit latency; completion time when a worker is running)
+- chat: POST /api/verifications/<id>/chat
+- rag: POST /api/rag/search and GET /api/rag/similar/<id> (skipped when RAG is unavailable)
+
+By default it starts the fake OpenAI server (fake_openai.py) and its own
+backend (and, with --with-worker, a batch worker) pointed at it, so no
+real OpenAI requests are made; a database is still required. Use --target
+to benchmark a backend that is already running instead.
+
+Results are written as JSON; --compare prints the change against an
+earlier results file and fails when throughput or p95 regress by more
+than --max-regression.
+
+Usage:
+    python python_backend/load_benchmark.py [--scenarios verifications,chat] [--concurrency 1,4,16]
+                                            [--requests 40] [--json results.json] [--compare previous.json]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fake_openai import start_fake_openai, parse_config_args, config_from_args
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(HERE)
+SCENARIOS = ["verifications", "batch", "chat", "rag"]
+
+
+# ---- HTTP helpers -------------------------------------------------------
+
+def http_request(method: str, url: str, body: bytes = None, headers: Dict[str, str] = None,
+                 timeout: float = 120) -> Tuple[int, Any]:
+    """Return (status, parsed JSON or None); connection errors come back as status 0"""
+    request = urllib.request.Request(url, data=body, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, raw = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, raw = e.code, e.read()
+    except (urllib.error.URLError, OSError):
+        return 0, None
+    try:
+        return status, json.loads(raw) if raw else None
+    except ValueError:
+        return status, None
+
+
+def post_json(url: str, payload: Dict[str, Any]) -> Tuple[int, Any]:
+    return http_request("POST", url, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+
+
+def post_multipart(url: str, fields: Dict[str, str], files: List[Tuple[str, str, bytes, str]]) -> Tuple[int, Any]:
+    """files is a list of (field name, filename, content, content type)"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode())
+    for name, filename, content, content_type in files:
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                   f"Content-Type: {content_type}\r\n\r\n".encode())
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return http_request("POST", url, body.getvalue(), {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+
+_base_document: Optional[bytes] = None
+
+
+def unique_document() -> bytes:
+    """A small ID-card sized JPEG; trailing bytes after EOI make each upload hash differently"""
+    global _base_document
+    if _base_document is None:
+        from PIL import Image, ImageDraw
+
+        image = Image.new("RGB", (1200, 760), (236, 240, 244))
+        draw = ImageDraw.Draw(image)
+        for line in range(8):
+            draw.text((80, 100 + line * 70), f"SAMPLE FIELD {line}: 0123456789", fill=(20, 20, 20))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+        _base_document = buffer.getvalue()
+    return _base_document + uuid.uuid4().bytes
+
+
+# ---- local stack --------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_health(base_url: str, timeout: float = 90) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, _ = http_request("GET", f"{base_url}/api/health", timeout=2)
+        if status == 200:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def start_local_stack(args) -> Tuple[str, List[subprocess.Popen], Any]:
+    fake_server, fake_state = start_fake_openai(config=config_from_args(args))
+    fake_url = f"http://127.0.0.1:{fake_server.server_address[1]}/v1"
+    port = free_port()
+    env = dict(
+        os.environ,
+        FLASK_PORT=str(port),
+        OPENAI_BASE_URL=fake_url,
+        OPENAI_API_BASE=fake_url,
+        OPENAI_API_KEY=os.environ.get("LOAD_TEST_OPENAI_API_KEY", "sk-fake-load-test"),
+        # Every upload is unique, but keep repeated runs from being served out of the cache
+        OCR_CACHE_ENABLED="false",
+        # The fake server has no quota; only throttle if a budget was set explicitly
+        OPENAI_RPM=os.environ.get("OPENAI_RPM", "1000000"),
+        OPENAI_TPM=os.environ.get("OPENAI_TPM", "1000000000"),
+        PYTHONUNBUFFERED="1"
+    )
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    processes = [subprocess.Popen([sys.executable, os.path.join(HERE, "app.py")], cwd=REPO_ROOT, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)]
+    if args.with_worker:
+        processes.append(subprocess.Popen([sys.executable, os.path.join(HERE, "batch_worker.py")], cwd=REPO_ROOT,
+                                          env=env, stdout=log, stderr=subprocess.STDOUT))
+    base_url = f"http://127.0.0.1:{port}"
+    if not wait_for_health(base_url):
+        stop_processes(processes)
+        raise SystemExit("[load] Backend did not become healthy; see --server-log")
+    print(f"[load] Backend on {base_url}, fake OpenAI on {fake_url}")
+    return base_url, processes, fake_state
+
+
+def stop_processes(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ---- scenarios ----------------------------------------------------------
+
+def create_verification(base_url: str) -> Optional[str]:
+    status, body = post_multipart(f"{base_url}/api/verifications", {},
+                                  [("document", "setup.jpg", unique_document(), "image/jpeg")])
+    return body.get("id") if status == 201 and body else None
+
+
+def wait_for_batch(base_url: str, job_id: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, job = http_request("GET", f"{base_url}/api/batch-jobs/{job_id}")
+        if status == 200 and job and job.get("completedAt"):
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def build_scenario(name: str, base_url: str, args) -> Optional[Callable[[int], int]]:
+    """Return a function that performs request number i and returns its HTTP status"""
+    if name == "verifications":
+        return lambda i: post_multipart(f"{base_url}/api/verifications", {},
+                                        [("document", f"load-{i}.jpg", unique_document(), "image/jpeg")])[0]
+
+    if name == "batch":
+        def submit(i: int) -> int:
+            files = [("documents", f"batch-{i}-{n}.jpg", unique_document(), "image/jpeg")
+                     for n in range(args.batch_size)]
+            status, job = post_multipart(f"{base_url}/api/batch-jobs", {"name": f"load test {i}"}, files)
+            if status == 202 and args.with_worker and not wait_for_batch(base_url, job["id"], args.batch_timeout):
+                return 504
+            return status
+        return submit
+
+    verification_id = create_verification(base_url)
+    if not verification_id:
+        print(f"[load] Could not create a verification for the {name} scenario; skipping")
+        return None
+
+    if name == "chat":
+        return lambda i: post_json(f"{base_url}/api/verifications/{verification_id}/chat",
+                                   {"content": f"Is this document safe to approve? ({i})"})[0]
+
+    if name == "rag":
+        _, rag_status = http_request("GET", f"{base_url}/api/rag/status")
+        if not rag_status or not rag_status.get("enabled"):
+            print("[load] RAG is not enabled on the backend; skipping rag scenario")
+            return None
+
+        def rag(i: int) -> int:
+            if i % 2:
+                return http_request("GET", f"{base_url}/api/rag/similar/{verification_id}")[0]
+            return post_json(f"{base_url}/api/rag/search", {"query": f"expired passport with blur {i % 7}"})[0]
+        return rag
+
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_level(scenario: str, perform: Callable[[int], int], concurrency: int, requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(i: int):
+        start = time.perf_counter()
+        status = perform(i)
+        ms = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(ms)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    duration = time.perf_counter() - started
+
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": ok,
+        "errors": requests - ok,
+        "statusCounts": statuses,
+        "durationS": round(duration, 3),
+        "throughputRps": round(ok / duration, 3) if duration else 0.0,
+        "latencyMs": {
+            "avg": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 1),
+            "p95": round(percentile(latencies, 0.95), 1),
+            "p99": round(percentile(latencies, 0.99), 1),
+            "max": round(latencies[-1], 1) if latencies else 0.0
+        }
+    }
+
+
+# ---- comparison ---------------------------------------------------------
+
+def compare(results: List[Dict[str, Any]], previous_path: str, max_regression: float) -> bool:
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    ok = True
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if not before:
+            continue
+        throughput_change = ((result["throughputRps"] - before["throughputRps"]) / before["throughputRps"]
+                             if before["throughputRps"] else 0.0)
+        p95_change = ((result["latencyMs"]["p95"] - before["latencyMs"]["p95"]) / before["latencyMs"]["p95"]
+                      if before["latencyMs"]["p95"] else 0.0)
+        regressed = throughput_change < -max_regression or p95_change > max_regression
+        ok = ok and not regressed
+        print(f"[compare] {'REGRESSED' if regressed else 'ok       '} {result['scenario']} x{result['concurrency']}: "
+              f"throughput {before['throughputRps']} -> {result['throughputRps']} rps ({throughput_change:+.1%}), "
+              f"p95 {before['latencyMs']['p95']} -> {result['latencyMs']['p95']} ms ({p95_change:+.1%})")
+    return ok
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the backend API against a fake OpenAI server")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario and concurrency level")
+    parser.add_argument("--batch-size", type=int, default=5, help="Documents per batch job")
+    parser.add_argument("--batch-timeout", type=float, default=300, help="Seconds to wait for a batch to finish")
+    parser.add_argument("--with-worker", action="store_true",
+                        help="Run a batch worker and time batch jobs to completion instead of submission only")
+    parser.add_argument("--target", help="Benchmark an already running backend (e.g. http://127.0.0.1:5001)")
+    parser.add_argument("--server-log", help="Write backend output to this file")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Fail --compare when throughput drops or p95 grows by more than this fraction")
+    parse_config_args(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    processes, fake_state = [], None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        base_url, processes, fake_state = start_local_stack(args)
+
+    started_at = datetime.now().isoformat()
+    results = []
+    try:
+        for scenario in scenarios:
+            perform = build_scenario(scenario, base_url, args)
+            if not perform:
+                continue
+            for concurrency in levels:
+                result = run_level(scenario, perform, concurrency, max(args.requests, concurrency))
+                results.append(result)
+                latency = result["latencyMs"]
+                print(f"[load] {scenario} x{concurrency}: {result['throughputRps']} rps, "
+                      f"p50 {latency['p50']} / p95 {latency['p95']} / p99 {latency['p99']} ms, "
+                      f"{result['errors']} errors {result['statusCounts']}")
+        _, backend_metrics = http_request("GET", f"{base_url}/api/metrics")
+    finally:
+        stop_processes(processes)
+
+    report = {
+        "startedAt": started_at,
+        "gitCommit": git_commit(),
+        "target": args.target or "local",
+        "fakeOpenAI": None if args.target else {**config_from_args(args), "payloads": bool(args.payloads)},
+        "settings": {"requests": args.requests, "batchSize": args.batch_size, "withWorker": args.with_worker},
+        "results": results,
+        "fakeOpenAIStats": fake_state.stats() if fake_state else None,
+        "backendMetrics": backend_metrics
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[load] Results written to {args.json}")
+
+    ok = compare(results, args.compare, args.max_regression) if args.compare else True
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
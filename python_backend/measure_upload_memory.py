@@ -0,0 +1,122 @@
+"""
+Upload Memory Check - Peak RSS of one POST /api/verifications
+Each document is uploaded in a fresh child process through Flask's test
+client, and the growth in peak RSS over a warmed-up baseline is reported
+next to the document size. On Linux the high-water mark is reset right
+before the upload; elsewhere ru_maxrss is used, which can under-report.
+The Vision call is replaced with a canned result so the measurement only
+covers the upload, storage and preprocessing path; a database is still
+required.
+
+Usage:
+    python python_backend/measure_upload_memory.py [files ...] [--max-ratio 0.5]
+"""
+
+import io
+import os
+import sys
+import json
+import argparse
+import resource
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def reset_peak_rss() -> int:
+    """Reset the peak RSS high-water mark where the kernel allows it and return current RSS"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return _proc_status_bytes("VmRSS")
+
+
+def _proc_status_bytes(field: str) -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def peak_rss_bytes() -> int:
+    peak = _proc_status_bytes("VmHWM")
+    if peak:
+        return peak
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure_child(path: str):
+    """Runs in the child process: warm up, then upload `path` once"""
+    sys.path.insert(0, HERE)
+    import app
+
+    app.extract_ocr_with_vision = lambda images, doc_type: {
+        "document_analysis": {"quality_score": 90, "is_readable": True, "potential_issues": []}
+    }
+    client = app.app.test_client()
+
+    warmup = client.post("/api/verifications", data={"document": (io.BytesIO(b"warmup"), "warmup.jpg")},
+                         content_type="multipart/form-data")
+    if warmup.status_code != 201:
+        raise SystemExit(f"warm-up upload failed: {warmup.status_code}")
+    baseline = reset_peak_rss() or peak_rss_bytes()
+
+    with open(path, "rb") as f:
+        response = client.post("/api/verifications", data={"document": (f, os.path.basename(path))},
+                               content_type="multipart/form-data")
+    peak = peak_rss_bytes()
+
+    print(json.dumps({"status": response.status_code, "baseline": baseline, "peak": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure peak RSS growth for a single document upload")
+    parser.add_argument("files", nargs="*", help="Documents to upload (default: synthetic phone photos)")
+    parser.add_argument("--max-ratio", type=float, default=0.5,
+                        help="Fail if peak RSS grows by more than this multiple of the document size")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(args.child)
+        return
+
+    files = list(args.files)
+    if not files:
+        sys.path.insert(0, HERE)
+        from benchmark_preprocess import synthetic_photo
+
+        os.makedirs("/tmp/upload-memory", exist_ok=True)
+        for i in range(2):
+            path = f"/tmp/upload-memory/synthetic-{i}.jpg"
+            with open(path, "wb") as f:
+                f.write(synthetic_photo(i))
+            files.append(path)
+
+    ok = True
+    env = dict(os.environ, MAX_UPLOAD_BYTES=str(max(os.path.getsize(p) for p in files) + 1))
+    for path in files:
+        output = subprocess.run([sys.executable, __file__, "--child", path], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        size = os.path.getsize(path)
+        growth = max(result["peak"] - result["baseline"], 0)
+        ratio = growth / size if size else 0
+        within = result["status"] == 201 and ratio <= args.max_ratio
+        ok = ok and within
+        print(f"[memory] {'ok  ' if within else 'FAIL'} {os.path.basename(path)}: {size} bytes uploaded, "
+              f"peak RSS +{growth} bytes ({ratio:.2f}x document size), status {result['status']}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
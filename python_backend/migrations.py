@@ -0,0 +1,407 @@
+"""
+Migrations Module - Versioned schema migrations
+Applies numbered migrations in order and records them in schema_migrations:
+- Serialized across processes with a Postgres advisory lock, polled rather than
+  waited on so a waiting process never holds a snapshot CIC would wait for
+- Regular migrations run in a single transaction
+- Concurrent migrations run in autocommit mode so indexes can be built
+  with CREATE INDEX CONCURRENTLY without blocking writers
+"""
+
+import re
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from db import get_db_connection
+
+MIGRATION_LOCK_KEY = 7340021
+MIGRATION_LOCK_POLL_INTERVAL = 0.5
+
+_CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+MIGRATIONS: List[Dict] = [
+    {
+        "version": 1,
+        "name": "core_tables",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS verifications (
+                id TEXT PRIMARY KEY,
+                document_type TEXT,
+                document_url TEXT,
+                status TEXT,
+                risk_score INTEGER,
+                risk_level TEXT,
+                customer_name TEXT,
+                submitted_at TIMESTAMP,
+                reviewed_at TIMESTAMP,
+                ocr_fields JSONB,
+                risk_insights JSONB,
+                validation_results JSONB
+            )
+            """,
+            "ALTER TABLE verifications ADD COLUMN IF NOT EXISTS document_hash TEXT",
+            "ALTER TABLE verifications ADD COLUMN IF NOT EXISTS document_mime_type TEXT",
+            """
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id TEXT PRIMARY KEY,
+                verification_id TEXT REFERENCES verifications(id),
+                role TEXT,
+                content TEXT,
+                timestamp TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS settings (
+                id INTEGER PRIMARY KEY DEFAULT 1,
+                auto_approve_threshold INTEGER DEFAULT 30,
+                high_risk_threshold INTEGER DEFAULT 70,
+                email_notifications BOOLEAN DEFAULT TRUE,
+                in_app_notifications BOOLEAN DEFAULT TRUE,
+                auto_reject_high_risk BOOLEAN DEFAULT FALSE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS audit_logs (
+                id TEXT PRIMARY KEY,
+                action TEXT NOT NULL,
+                entity_type TEXT NOT NULL,
+                entity_id TEXT,
+                user_id TEXT DEFAULT 'system',
+                user_name TEXT DEFAULT 'System',
+                details JSONB,
+                ip_address TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                status TEXT DEFAULT 'pending',
+                total_documents INTEGER DEFAULT 0,
+                processed_documents INTEGER DEFAULT 0,
+                successful_documents INTEGER DEFAULT 0,
+                failed_documents INTEGER DEFAULT 0,
+                verification_ids JSONB DEFAULT '[]',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                completed_at TIMESTAMP,
+                error_message TEXT
+            )
+            """,
+            """
+            INSERT INTO settings (id, auto_approve_threshold, high_risk_threshold,
+                                  email_notifications, in_app_notifications, auto_reject_high_risk)
+            VALUES (1, 30, 70, TRUE, TRUE, FALSE)
+            ON CONFLICT (id) DO NOTHING
+            """
+        ]
+    },
+    {
+        "version": 2,
+        "name": "verification_daily_stats",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS verification_daily_stats (
+                day DATE NOT NULL,
+                status TEXT NOT NULL,
+                risk_level TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, status, risk_level)
+            )
+            """,
+            # Rollup maintained by trigger so every writer (single, batch, bulk) keeps it in sync.
+            # Rows without submitted_at are bucketed under -infinity: counted in totals, never in volume.
+            """
+            CREATE OR REPLACE FUNCTION verification_daily_stats_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE verification_daily_stats SET count = count - 1
+                    WHERE day = COALESCE(DATE(OLD.submitted_at), '-infinity'::date)
+                      AND status = COALESCE(OLD.status, '')
+                      AND risk_level = COALESCE(OLD.risk_level, '');
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO verification_daily_stats (day, status, risk_level, count)
+                    VALUES (COALESCE(DATE(NEW.submitted_at), '-infinity'::date),
+                            COALESCE(NEW.status, ''), COALESCE(NEW.risk_level, ''), 1)
+                    ON CONFLICT (day, status, risk_level)
+                    DO UPDATE SET count = verification_daily_stats.count + 1;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS verifications_daily_stats_write ON verifications",
+            """
+            CREATE TRIGGER verifications_daily_stats_write
+            AFTER INSERT OR DELETE ON verifications
+            FOR EACH ROW EXECUTE FUNCTION verification_daily_stats_apply()
+            """,
+            "DROP TRIGGER IF EXISTS verifications_daily_stats_update ON verifications",
+            """
+            CREATE TRIGGER verifications_daily_stats_update
+            AFTER UPDATE OF status, risk_level, submitted_at ON verifications
+            FOR EACH ROW
+            WHEN (OLD.status IS DISTINCT FROM NEW.status
+                  OR OLD.risk_level IS DISTINCT FROM NEW.risk_level
+                  OR DATE(OLD.submitted_at) IS DISTINCT FROM DATE(NEW.submitted_at))
+            EXECUTE FUNCTION verification_daily_stats_apply()
+            """,
+            """
+            INSERT INTO verification_daily_stats (day, status, risk_level, count)
+            SELECT COALESCE(DATE(submitted_at), '-infinity'::date),
+                   COALESCE(status, ''), COALESCE(risk_level, ''), COUNT(*)
+            FROM verifications
+            WHERE NOT EXISTS (SELECT 1 FROM verification_daily_stats)
+            GROUP BY 1, 2, 3
+            """
+        ]
+    },
+    {
+        "version": 3,
+        "name": "hot_path_indexes",
+        "concurrent": True,
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_verifications_submitted_at "
+            "ON verifications (submitted_at DESC, id DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_verifications_status_submitted_at "
+            "ON verifications (status, submitted_at DESC, id DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_messages_verification_timestamp "
+            "ON chat_messages (verification_id, timestamp)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_timestamp "
+            "ON audit_logs (timestamp DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_action_timestamp "
+            "ON audit_logs (action, timestamp DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_entity_type_timestamp "
+            "ON audit_logs (entity_type, timestamp DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_entity_id_timestamp "
+            "ON audit_logs (entity_id, timestamp DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_user_id_timestamp "
+            "ON audit_logs (user_id, timestamp DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_batch_jobs_created_at "
+            "ON batch_jobs (created_at DESC)"
+        ]
+    },
+    {
+        "version": 4,
+        "name": "count_estimate_function",
+        "statements": [
+            # Planner row estimate for an arbitrary SELECT, used for large filtered totals
+            """
+            CREATE OR REPLACE FUNCTION count_estimate(query TEXT) RETURNS BIGINT AS $$
+            DECLARE
+                plan JSONB;
+            BEGIN
+                EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+                RETURN (plan->0->'Plan'->>'Plan Rows')::BIGINT;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        ]
+    },
+    {
+        "version": 5,
+        "name": "audit_logs_keyset_index",
+        "concurrent": True,
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_timestamp_id "
+            "ON audit_logs (timestamp DESC, id DESC)",
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_logs_timestamp"
+        ]
+    },
+    {
+        "version": 6,
+        "name": "settings_version",
+        "statements": [
+            "ALTER TABLE settings ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1"
+        ]
+    },
+    {
+        "version": 7,
+        "name": "batch_job_items",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS batch_job_items (
+                batch_job_id TEXT NOT NULL REFERENCES batch_jobs(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                filename TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                verification_id TEXT,
+                error_message TEXT,
+                completed_at TIMESTAMP,
+                PRIMARY KEY (batch_job_id, position)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_batch_job_items_verification_id "
+            "ON batch_job_items (verification_id)",
+            # Carry over verification_ids recorded by the JSONB column before this table existed
+            """
+            INSERT INTO batch_job_items (batch_job_id, position, status, verification_id)
+            SELECT j.id, ids.ordinality - 1, 'succeeded', ids.value
+            FROM batch_jobs j,
+                 jsonb_array_elements_text(COALESCE(j.verification_ids, '[]'::jsonb)) WITH ORDINALITY AS ids(value, ordinality)
+            ON CONFLICT (batch_job_id, position) DO NOTHING
+            """
+        ]
+    },
+    {
+        "version": 8,
+        "name": "batch_job_queue",
+        "statements": [
+            "ALTER TABLE batch_job_items ADD COLUMN IF NOT EXISTS document_hash TEXT",
+            "ALTER TABLE batch_job_items ADD COLUMN IF NOT EXISTS mime_type TEXT",
+            "ALTER TABLE batch_job_items ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE batch_job_items ADD COLUMN IF NOT EXISTS available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+            "ALTER TABLE batch_job_items ADD COLUMN IF NOT EXISTS locked_at TIMESTAMP",
+            "ALTER TABLE batch_job_items ADD COLUMN IF NOT EXISTS locked_by TEXT",
+            # Only unfinished items are ever scanned by workers claiming work
+            "CREATE INDEX IF NOT EXISTS idx_batch_job_items_queue "
+            "ON batch_job_items (available_at) WHERE status IN ('pending', 'processing')"
+        ]
+    },
+    {
+        "version": 9,
+        "name": "ocr_cache",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                document_hash TEXT NOT NULL,
+                document_type TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result JSONB NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_hit_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (document_hash, document_type, prompt_version)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_hit_at ON ocr_cache (last_hit_at DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_ocr_cache_created_at ON ocr_cache (created_at)"
+        ]
+    },
+    {
+        "version": 10,
+        "name": "verification_processing_timings",
+        "statements": [
+            "ALTER TABLE verifications ADD COLUMN IF NOT EXISTS processing_timings JSONB"
+        ]
+    },
+    {
+        "version": 11,
+        "name": "rate_limit_buckets",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                name TEXT PRIMARY KEY,
+                tokens DOUBLE PRECISION NOT NULL,
+                capacity DOUBLE PRECISION NOT NULL,
+                refill_per_sec DOUBLE PRECISION NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                blocked_until TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """
+        ]
+    }
+]
+
+
+def _drop_invalid_indexes(cur, migration: Dict):
+    """Drop indexes this migration left INVALID in an interrupted CREATE INDEX CONCURRENTLY.
+
+    Only the migration's own index names are considered, so an invalid index
+    someone else is building (or left behind) is never touched.
+    """
+    names = [match.group(1) for statement in migration["statements"]
+             for match in _CONCURRENT_INDEX.finditer(statement)]
+    if not names:
+        return
+    cur.execute("""
+        SELECT c.relname AS name
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE NOT i.indisvalid AND n.nspname = current_schema() AND c.relname = ANY(%s)
+    """, (names,))
+    for row in cur.fetchall():
+        print(f"[migrations] Dropping invalid index {row['name']}")
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{row["name"]}"')
+
+
+def _acquire_migration_lock(cur):
+    """Take the migration lock, retrying with pg_try_advisory_lock.
+
+    A blocking pg_advisory_lock call keeps its statement, and so its snapshot,
+    open while it waits. CREATE INDEX CONCURRENTLY in the lock holder then
+    waits for that snapshot to go away, and the two processes deadlock.
+    """
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (MIGRATION_LOCK_KEY,))
+        if cur.fetchone()["locked"]:
+            return
+        time.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+
+def get_applied_versions(cur) -> List[int]:
+    cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row["version"] for row in cur.fetchall()]
+
+
+def run_migrations() -> List[int]:
+    """Apply all pending migrations, returning the versions applied"""
+    conn = get_db_connection()
+    applied_now = []
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        _acquire_migration_lock(cur)
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL
+                )
+            """)
+            applied = set(get_applied_versions(cur))
+
+            for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+                if migration["version"] in applied:
+                    continue
+
+                print(f"[migrations] Applying {migration['version']:04d}_{migration['name']}")
+                if migration.get("concurrent"):
+                    _drop_invalid_indexes(cur, migration)
+                    for statement in migration["statements"]:
+                        cur.execute(statement)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                        (migration["version"], migration["name"], datetime.now())
+                    )
+                else:
+                    conn.autocommit = False
+                    try:
+                        for statement in migration["statements"]:
+                            cur.execute(statement)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                            (migration["version"], migration["name"], datetime.now())
+                        )
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+
+                applied_now.append(migration["version"])
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            cur.close()
+    finally:
+        conn.autocommit = False
+        conn.close()
+
+    return applied_now
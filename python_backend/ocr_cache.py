@@ -0,0 +1,146 @@
+"""
+OCR Cache Module - Reuse Vision OCR results for identical documents
+Results are stored in Postgres keyed by the document's SHA-256, the
+document type the prompt was built for, and the prompt version:
+- Re-uploads of the same image skip the Vision call entirely
+- Bumping the prompt version naturally invalidates older results
+- Entries expire after a TTL; the table is trimmed to a maximum size by last use
+- Hit/miss counters for the metrics endpoint
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from db import get_db_connection
+
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "true").lower() != "false"
+OCR_CACHE_TTL_DAYS = float(os.environ.get("OCR_CACHE_TTL_DAYS", 30))
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", 50000))
+OCR_CACHE_PRUNE_EVERY = 100
+
+
+class OcrCache:
+    """Postgres-backed OCR result cache with TTL and size eviction"""
+
+    def __init__(self, enabled: bool = OCR_CACHE_ENABLED, ttl_days: float = OCR_CACHE_TTL_DAYS,
+                 max_entries: int = OCR_CACHE_MAX_ENTRIES):
+        self.enabled = enabled
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._errors = 0
+
+    def _execute(self, query: str, params: tuple, fetch: bool = False):
+        """Run one statement in its own transaction; returns the first row or the row count"""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            result = cur.fetchone() if fetch else cur.rowcount
+            conn.commit()
+            cur.close()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get(self, document_hash: str, doc_type: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """Return a cached OCR result, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        row = None
+        try:
+            row = self._execute("""
+                UPDATE ocr_cache SET hits = hits + 1, last_hit_at = NOW()
+                WHERE document_hash = %s AND document_type = %s AND prompt_version = %s
+                  AND created_at > NOW() - make_interval(secs => %s)
+                RETURNING result
+            """, (document_hash, doc_type, prompt_version, self.ttl_days * 86400), fetch=True)
+        except Exception as e:
+            self._errors += 1
+            print(f"[ocr-cache] Lookup error: {e}")
+
+        with self._lock:
+            if row:
+                self._hits += 1
+            else:
+                self._misses += 1
+        if not row:
+            return None
+        result = row["result"]
+        return json.loads(result) if isinstance(result, str) else result
+
+    def put(self, document_hash: str, doc_type: str, prompt_version: str, result: Dict[str, Any]):
+        """Store an OCR result, replacing any previous entry for the same key"""
+        if not self.enabled or result is None:
+            return
+
+        try:
+            self._execute("""
+                INSERT INTO ocr_cache (document_hash, document_type, prompt_version, result, created_at, last_hit_at)
+                VALUES (%s, %s, %s, %s, NOW(), NOW())
+                ON CONFLICT (document_hash, document_type, prompt_version)
+                DO UPDATE SET result = EXCLUDED.result, created_at = NOW(), last_hit_at = NOW(), hits = 0
+            """, (document_hash, doc_type, prompt_version, json.dumps(result)))
+        except Exception as e:
+            self._errors += 1
+            print(f"[ocr-cache] Store error: {e}")
+            return
+
+        with self._lock:
+            self._stores += 1
+            prune = self._stores % OCR_CACHE_PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired entries and the least recently used ones beyond max_entries"""
+        try:
+            removed = self._execute("DELETE FROM ocr_cache WHERE created_at <= NOW() - make_interval(secs => %s)",
+                                    (self.ttl_days * 86400,))
+            removed += self._execute("""
+                DELETE FROM ocr_cache
+                WHERE (document_hash, document_type, prompt_version) IN (
+                    SELECT document_hash, document_type, prompt_version
+                    FROM ocr_cache
+                    ORDER BY last_hit_at DESC
+                    OFFSET %s
+                )
+            """, (self.max_entries,))
+        except Exception as e:
+            self._errors += 1
+            print(f"[ocr-cache] Prune error: {e}")
+            return 0
+
+        with self._lock:
+            self._evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hitRate": round(self._hits / total, 4) if total else 0.0,
+            "stores": self._stores,
+            "evictions": self._evictions,
+            "errors": self._errors
+        }
+
+
+ocr_cache = OcrCache()
+
+
+def get_ocr_cache_stats() -> Dict[str, Any]:
+    return ocr_cache.stats()
@@ -0,0 +1,172 @@
+"""
+OCR Packing Module - Several batch documents per Vision request
+Batch documents are OCR'd in packs instead of one request each, so the
+prompt and round trip are paid once per pack:
+- Pack size adapts to each image's high-detail token cost and payload size
+- Multi-page documents are never packed; they keep their own request
+- The pack prompt asks for a JSON array with one result per image, in order
+- Responses that cannot be matched to every image are rejected, so the caller
+  can fall back to per-image requests
+- Packing counters (packs, fallbacks, requests saved)
+"""
+
+import io
+import os
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from openai_limiter import IMAGE_TOKENS_HIGH_DETAIL
+
+OCR_PACK_ENABLED = os.environ.get("OCR_PACK_ENABLED", "true").lower() != "false"
+OCR_PACK_MAX_IMAGES = max(int(os.environ.get("OCR_PACK_MAX_IMAGES", 4)), 1)
+OCR_PACK_TOKEN_BUDGET = int(os.environ.get("OCR_PACK_TOKEN_BUDGET", 12000))
+OCR_PACK_MAX_BYTES = int(os.environ.get("OCR_PACK_MAX_BYTES", 12 * 1024 * 1024))
+OCR_PACK_OUTPUT_TOKENS_PER_IMAGE = 700
+
+OCR_RESULT_SCHEMA = """{
+    "extracted_fields": [
+        {"fieldName": "Full Name", "value": "extracted value", "confidence": 95},
+        {"fieldName": "Document Number", "value": "extracted value", "confidence": 98},
+        {"fieldName": "Date of Birth", "value": "YYYY-MM-DD format", "confidence": 92},
+        {"fieldName": "Expiry Date", "value": "YYYY-MM-DD format", "confidence": 90},
+        {"fieldName": "Issuing Country", "value": "country name", "confidence": 88}
+    ],
+    "document_analysis": {
+        "detected_type": "passport|drivers_license|national_id",
+        "quality_score": 85,
+        "is_readable": true,
+        "potential_issues": ["list any visible issues like blur, damage, etc"]
+    }
+}"""
+
+Images = List[Tuple[bytes, str]]
+
+_stats_lock = threading.Lock()
+_stats = {
+    "packs": 0,
+    "packedDocuments": 0,
+    "singleRequests": 0,
+    "fallbacks": 0,
+    "requestsSaved": 0
+}
+
+
+def image_tokens(data: bytes) -> int:
+    """Input tokens gpt-4o bills for one high-detail image"""
+    if not PIL_AVAILABLE:
+        return IMAGE_TOKENS_HIGH_DETAIL
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except Exception:
+        return IMAGE_TOKENS_HIGH_DETAIL
+
+    # Fit within 2048x2048, then bring the short side down to 768, then count 512px tiles
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / (min(width, height) * scale))
+    tiles = math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+    return 85 + 170 * tiles
+
+
+def plan_packs(documents: List[Images]) -> List[List[int]]:
+    """Group document indexes into Vision requests, keeping input order.
+
+    A pack is closed when adding the next document would exceed the image
+    count, token budget or payload size. Multi-page documents go alone.
+    """
+    packs: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = current_bytes = 0
+
+    for index, images in enumerate(documents):
+        if not OCR_PACK_ENABLED or len(images) != 1:
+            packs.append([index])
+            continue
+
+        data = images[0][0]
+        tokens, size = image_tokens(data), len(data)
+        if current and (len(current) >= OCR_PACK_MAX_IMAGES
+                        or current_tokens + tokens > OCR_PACK_TOKEN_BUDGET
+                        or current_bytes + size > OCR_PACK_MAX_BYTES):
+            packs.append(current)
+            current, current_tokens, current_bytes = [], 0, 0
+        current.append(index)
+        current_tokens += tokens
+        current_bytes += size
+
+    if current:
+        packs.append(current)
+    return packs
+
+
+def build_pack_prompt(doc_types: List[str]) -> str:
+    hints = "\n".join(
+        f"- Image {number}: expected {doc_type.replace('_', ' ')}" for number, doc_type in enumerate(doc_types, 1)
+    )
+    return f"""You are given {len(doc_types)} separate identity document images, numbered 1 to {len(doc_types)} in the order they appear. Analyze each image on its own and extract all visible text fields.
+{hints}
+
+Return a JSON array with exactly {len(doc_types)} objects, one per image and in the same order. Each object has an "image" number and the following structure:
+{OCR_RESULT_SCHEMA}
+
+Only include fields that are actually visible in that document. Estimate confidence based on text clarity. Never mix fields between images."""
+
+
+def pack_output_tokens(count: int) -> int:
+    return min(4096, OCR_PACK_OUTPUT_TOKENS_PER_IMAGE * count)
+
+
+def parse_pack_response(response_text: str, count: int) -> Optional[List[Dict[str, Any]]]:
+    """Per-image results in input order, or None if any image cannot be matched"""
+    start, end = response_text.find("["), response_text.rfind("]") + 1
+    if start < 0 or end <= start:
+        return None
+    try:
+        results = json.loads(response_text[start:end])
+    except ValueError:
+        return None
+    if not isinstance(results, list) or len(results) != count:
+        return None
+    if not all(isinstance(r, dict) and isinstance(r.get("document_analysis"), dict) for r in results):
+        return None
+
+    numbers = [r.get("image") for r in results]
+    if all(isinstance(n, int) for n in numbers):
+        if sorted(numbers) != list(range(1, count + 1)):
+            return None
+        results = sorted(results, key=lambda r: r["image"])
+    return [{key: value for key, value in r.items() if key != "image"} for r in results]
+
+
+def record_pack(size: int, fell_back: bool = False):
+    with _stats_lock:
+        if size == 1:
+            _stats["singleRequests"] += 1
+            return
+        _stats["packs"] += 1
+        _stats["packedDocuments"] += size
+        if fell_back:
+            # The failed pack request comes on top of the per-image ones
+            _stats["fallbacks"] += 1
+            _stats["requestsSaved"] -= 1
+        else:
+            _stats["requestsSaved"] += size - 1
+
+
+def get_ocr_packing_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {
+            "enabled": OCR_PACK_ENABLED,
+            "maxImages": OCR_PACK_MAX_IMAGES,
+            "tokenBudget": OCR_PACK_TOKEN_BUDGET,
+            **_stats,
+            "avgPackSize": round(_stats["packedDocuments"] / _stats["packs"], 2) if _stats["packs"] else 0.0
+        }
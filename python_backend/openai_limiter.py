@@ -0,0 +1,343 @@
+"""
+OpenAI Limiter Module - Shared rate limiting and adaptive concurrency for OpenAI calls
+Every OpenAI request (Vision OCR, chat, RAG chat) goes through one limiter:
+- Request and token buckets stored in Postgres, so all threads and worker processes share one budget
+- A 429's Retry-After pauses every process until it expires
+- AIMD concurrency per process: +1/limit per success, halved on 429/5xx
+- Retries with full-jitter exponential backoff
+- Metrics for queue wait time, throttling and the current concurrency limit
+- Bucket queries use a small pool of their own, never the request pool, and the
+  calling request's connection goes back to the pool before the OpenAI request
+"""
+
+import os
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import openai
+
+from db import ConnectionPool, PooledConnection, DATABASE_URL, DB_POOL_HEALTHCHECK_IDLE, yield_request_connection
+from stage_metrics import LatencyHistogram
+
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", 500))
+OPENAI_TPM = float(os.environ.get("OPENAI_TPM", 30000))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 8))
+OPENAI_MIN_CONCURRENCY = int(os.environ.get("OPENAI_MIN_CONCURRENCY", 1))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 3))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", 0.5))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", 20))
+OPENAI_ACQUIRE_TIMEOUT = float(os.environ.get("OPENAI_ACQUIRE_TIMEOUT", 60))
+# OpenAI rate limits are per model; embeddings get their own (much larger) budget
+OPENAI_EMBEDDING_RPM = float(os.environ.get("OPENAI_EMBEDDING_RPM", 3000))
+OPENAI_EMBEDDING_TPM = float(os.environ.get("OPENAI_EMBEDDING_TPM", 1000000))
+OPENAI_LIMITER_DB_POOL_SIZE = int(os.environ.get("OPENAI_LIMITER_DB_POOL_SIZE", 2))
+OPENAI_LIMITER_DB_TIMEOUT = float(os.environ.get("OPENAI_LIMITER_DB_TIMEOUT", 5))
+
+# gpt-4o high detail: a 2048x768 image is 8 tiles of 170 tokens plus 85 base tokens
+IMAGE_TOKENS_HIGH_DETAIL = 1445
+CONGESTION_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LimiterTimeoutError(Exception):
+    """Raised when a call could not get a concurrency slot or budget in time"""
+
+
+def estimate_tokens(prompt_chars: int, max_tokens: int, images: int = 0) -> int:
+    """Rough upper bound on the tokens a request will consume"""
+    return prompt_chars // 4 + max_tokens + images * IMAGE_TOKENS_HIGH_DETAIL
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _actual_tokens(result: Any) -> Optional[int]:
+    """Total tokens reported by an OpenAI SDK response or a LangChain message"""
+    usage = getattr(result, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None) is not None:
+        return usage.total_tokens
+    usage_metadata = getattr(result, "usage_metadata", None)
+    if usage_metadata and usage_metadata.get("total_tokens") is not None:
+        return usage_metadata["total_tokens"]
+    return None
+
+
+_bucket_pool: Optional[ConnectionPool] = None
+_bucket_pool_lock = threading.Lock()
+
+
+def _bucket_connection() -> PooledConnection:
+    """Borrow from the limiter's own pool.
+
+    Callers usually already hold a request connection from the main pool;
+    taking a second one there deadlocks once every pooled connection belongs
+    to a request waiting on OpenAI.
+    """
+    global _bucket_pool
+    if _bucket_pool is None:
+        with _bucket_pool_lock:
+            if _bucket_pool is None:
+                _bucket_pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=0,
+                    max_size=OPENAI_LIMITER_DB_POOL_SIZE,
+                    timeout=OPENAI_LIMITER_DB_TIMEOUT,
+                    healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE
+                )
+    return PooledConnection(_bucket_pool, _bucket_pool.getconn())
+
+
+class OpenAILimiter:
+    """Cross-process token/request buckets plus per-process AIMD concurrency"""
+
+    def __init__(self, name: str = "openai", rpm: float = OPENAI_RPM, tpm: float = OPENAI_TPM,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY, min_concurrency: int = OPENAI_MIN_CONCURRENCY,
+                 max_retries: int = OPENAI_MAX_RETRIES, acquire_timeout: float = OPENAI_ACQUIRE_TIMEOUT):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._buckets_ready = False
+
+        self._queue_wait = LatencyHistogram()
+        self._counters = {
+            "calls": 0,
+            "successes": 0,
+            "retries": 0,
+            "throttled": 0,
+            "serverErrors": 0,
+            "failures": 0,
+            "bucketErrors": 0
+        }
+
+    def _count(self, counter: str):
+        with self._cond:
+            self._counters[counter] += 1
+
+    # ---- shared buckets -------------------------------------------------
+
+    def _ensure_buckets(self, cur):
+        if self._buckets_ready:
+            return
+        cur.execute("""
+            INSERT INTO rate_limit_buckets (name, tokens, capacity, refill_per_sec)
+            VALUES (%s, %s, %s, %s), (%s, %s, %s, %s)
+            ON CONFLICT (name) DO UPDATE SET
+                capacity = EXCLUDED.capacity,
+                refill_per_sec = EXCLUDED.refill_per_sec
+        """, (f"{self.name}:requests", self.rpm, self.rpm, self.rpm / 60,
+              f"{self.name}:tokens", self.tpm, self.tpm, self.tpm / 60))
+
+    def _try_take(self, tokens: int) -> Tuple[bool, float]:
+        """Atomically take one request and `tokens` tokens; returns (granted, seconds to wait)"""
+        tokens = min(tokens, self.tpm)
+        conn = None
+        try:
+            conn = _bucket_connection()
+            cur = conn.cursor()
+            self._ensure_buckets(cur)
+            cur.execute("""
+                WITH b AS (
+                    SELECT name, refill_per_sec, blocked_until,
+                           LEAST(capacity, tokens + EXTRACT(EPOCH FROM clock_timestamp() - updated_at) * refill_per_sec)
+                               AS available,
+                           CASE WHEN name = %(requests)s THEN 1 ELSE %(tokens)s END AS wanted
+                    FROM rate_limit_buckets
+                    WHERE name IN (%(requests)s, %(token_bucket)s)
+                    FOR UPDATE
+                ), decision AS (
+                    SELECT bool_and(available >= wanted AND blocked_until <= clock_timestamp()) AS granted,
+                           GREATEST(
+                               MAX((wanted - available) / NULLIF(refill_per_sec, 0)),
+                               MAX(EXTRACT(EPOCH FROM blocked_until - clock_timestamp()))
+                           ) AS wait_seconds
+                    FROM b
+                )
+                UPDATE rate_limit_buckets r SET
+                    tokens = b.available - CASE WHEN decision.granted THEN b.wanted ELSE 0 END,
+                    updated_at = clock_timestamp()
+                FROM b, decision
+                WHERE r.name = b.name
+                RETURNING decision.granted, decision.wait_seconds
+            """, {"requests": f"{self.name}:requests", "token_bucket": f"{self.name}:tokens", "tokens": tokens})
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+            self._buckets_ready = True
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            self._count("bucketErrors")
+            print(f"[openai-limiter] Bucket check failed, allowing call: {e}")
+            return True, 0.0
+        finally:
+            if conn is not None:
+                conn.close()
+
+        if not row:
+            return True, 0.0
+        return bool(row["granted"]), max(float(row["wait_seconds"] or 0.0), 0.0)
+
+    def _adjust_tokens(self, delta: float):
+        """Refund (positive) or charge (negative) tokens once actual usage is known"""
+        if not delta:
+            return
+        self._execute_quietly("""
+            UPDATE rate_limit_buckets SET tokens = LEAST(capacity, tokens + %s) WHERE name = %s
+        """, (delta, f"{self.name}:tokens"))
+
+    def _pause_all(self, seconds: float):
+        """Stop every process from calling until Retry-After has passed"""
+        self._execute_quietly("""
+            UPDATE rate_limit_buckets
+            SET blocked_until = GREATEST(blocked_until, clock_timestamp() + make_interval(secs => %s))
+            WHERE name = %s
+        """, (seconds, f"{self.name}:requests"))
+
+    def _execute_quietly(self, query: str, params: tuple):
+        conn = None
+        try:
+            conn = _bucket_connection()
+            cur = conn.cursor()
+            cur.execute(query, params)
+            conn.commit()
+            cur.close()
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            self._count("bucketErrors")
+            print(f"[openai-limiter] Bucket update failed: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    # ---- adaptive concurrency -------------------------------------------
+
+    def _acquire_slot(self, deadline: float):
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._in_flight >= max(int(self._limit), self.min_concurrency):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LimiterTimeoutError("Timed out waiting for an OpenAI concurrency slot")
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+
+    def _release_slot(self, congested: bool, succeeded: bool):
+        """Halve the limit on congestion, grow it on success; other outcomes leave it alone"""
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if congested:
+                # Halve at most once per second so one burst of 429s is one decrease
+                if now - self._last_decrease >= 1.0:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = now
+            elif succeeded:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / max(self._limit, 1.0))
+            self._cond.notify_all()
+
+    # ---- public API -----------------------------------------------------
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int) -> Any:
+        """Run `fn` (one OpenAI request) under the shared limits, retrying transient failures"""
+        yield_request_connection()
+        self._count("calls")
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            deadline = start + self.acquire_timeout
+            self._acquire_slot(deadline)
+            congested = succeeded = False
+            try:
+                while True:
+                    granted, wait = self._try_take(estimated_tokens)
+                    if granted:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LimiterTimeoutError("Timed out waiting for OpenAI rate limit budget")
+                    time.sleep(min(wait + random.uniform(0, 0.05), remaining))
+                self._queue_wait.observe((time.monotonic() - start) * 1000)
+
+                try:
+                    result = fn()
+                except (openai.APIStatusError, openai.APIConnectionError) as e:
+                    status = getattr(e, "status_code", None)
+                    congested = status in CONGESTION_STATUS_CODES or isinstance(e, openai.APITimeoutError)
+                    retryable = congested or (status is None and isinstance(e, openai.APIConnectionError))
+                    if status == 429:
+                        self._count("throttled")
+                    elif status is not None and status >= 500:
+                        self._count("serverErrors")
+
+                    retry_after = _retry_after_seconds(e)
+                    if status == 429 and retry_after:
+                        self._pause_all(retry_after)
+
+                    if not retryable or attempt >= self.max_retries:
+                        self._count("failures")
+                        raise
+                    delay = retry_after if retry_after else random.uniform(
+                        0, min(OPENAI_RETRY_MAX_DELAY, OPENAI_RETRY_BASE_DELAY * (2 ** attempt)))
+                else:
+                    succeeded = True
+                    self._count("successes")
+                    actual = _actual_tokens(result)
+                    if actual is not None:
+                        self._adjust_tokens(min(estimated_tokens, self.tpm) - actual)
+                    return result
+            finally:
+                self._release_slot(congested, succeeded)
+
+            attempt += 1
+            self._count("retries")
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                "concurrencyLimit": round(self._limit, 2),
+                "inFlight": self._in_flight,
+                "waiting": self._waiting,
+                **self._counters
+            }
+        stats["queueWaitMs"] = self._queue_wait.stats()
+        return stats
+
+
+openai_limiter = OpenAILimiter()
+embedding_limiter = OpenAILimiter(name="openai-embeddings", rpm=OPENAI_EMBEDDING_RPM, tpm=OPENAI_EMBEDDING_TPM)
+
+
+def get_openai_limiter_stats() -> Dict[str, Any]:
+    return openai_limiter.stats()
+
+
+def get_embedding_limiter_stats() -> Dict[str, Any]:
+    return embedding_limiter.stats()
@@ -0,0 +1,192 @@
+"""
+Query Embedding Cache Module - Reuse embeddings for repeated retrieval queries
+Retrieval helpers build the same query text for the same verification again
+and again (chat, similar, analyze); each lookup used to cost an embeddings
+request. Vectors are cached by a hash of the whitespace-normalized text and
+the embedding model:
+- In-memory LRU in front of an on-disk SQLite store that survives restarts
+- The disk store is trimmed to a maximum size by last use
+- Memory hits, disk hits and misses counted for the metrics endpoint
+"""
+
+import os
+import re
+import array
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+QUERY_EMBED_CACHE_ENABLED = os.environ.get("QUERY_EMBED_CACHE_ENABLED", "true").lower() != "false"
+QUERY_EMBED_CACHE_PATH = os.environ.get("QUERY_EMBED_CACHE_PATH", "./chroma_db/query_embeddings.sqlite3")
+QUERY_EMBED_CACHE_MEMORY_ENTRIES = int(os.environ.get("QUERY_EMBED_CACHE_MEMORY_ENTRIES", 1000))
+QUERY_EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_EMBED_CACHE_MAX_ENTRIES", 20000))
+QUERY_EMBED_CACHE_PRUNE_EVERY = 100
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Collapse the indentation and line breaks the query templates introduce"""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def query_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Two-level (memory LRU + SQLite) cache of query embeddings"""
+
+    def __init__(self, path: str = QUERY_EMBED_CACHE_PATH, enabled: bool = QUERY_EMBED_CACHE_ENABLED,
+                 memory_entries: int = QUERY_EMBED_CACHE_MEMORY_ENTRIES,
+                 max_entries: int = QUERY_EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.enabled = enabled
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the store on first use; callers hold self._lock"""
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    last_used_at REAL NOT NULL DEFAULT (julianday('now'))
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_last_used ON query_embeddings (last_used_at)")
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        """Return a cached embedding, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        key = query_key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return vector
+
+            row = None
+            try:
+                db = self._connection()
+                row = db.execute("SELECT embedding FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+                if row:
+                    db.execute("UPDATE query_embeddings SET hits = hits + 1, last_used_at = julianday('now') "
+                               "WHERE key = ?", (key,))
+                    db.commit()
+            except sqlite3.Error as e:
+                self._errors += 1
+                print(f"[query-embed-cache] Lookup error: {e}")
+
+            if not row:
+                self._misses += 1
+                return None
+            vector = array.array("f", row[0]).tolist()
+            self._remember(key, vector)
+            self._disk_hits += 1
+            return vector
+
+    def put(self, text: str, model: str, vector: List[float]):
+        """Store an embedding in memory and on disk"""
+        if not self.enabled or not vector:
+            return
+
+        key = query_key(text, model)
+        with self._lock:
+            self._remember(key, list(vector))
+            try:
+                db = self._connection()
+                db.execute("""
+                    INSERT INTO query_embeddings (key, model, embedding, last_used_at)
+                    VALUES (?, ?, ?, julianday('now'))
+                    ON CONFLICT (key) DO UPDATE SET embedding = excluded.embedding, last_used_at = excluded.last_used_at
+                """, (key, model, array.array("f", vector).tobytes()))
+                db.commit()
+            except sqlite3.Error as e:
+                self._errors += 1
+                print(f"[query-embed-cache] Store error: {e}")
+                return
+            self._stores += 1
+            prune = self._stores % QUERY_EMBED_CACHE_PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def get_or_compute(self, text: str, model: str, compute: Callable[[str], List[float]]) -> List[float]:
+        vector = self.get(text, model)
+        if vector is None:
+            vector = compute(text)
+            self.put(text, model, vector)
+        return vector
+
+    def prune(self) -> int:
+        """Delete the least recently used entries beyond max_entries"""
+        with self._lock:
+            try:
+                db = self._connection()
+                removed = db.execute("""
+                    DELETE FROM query_embeddings WHERE key IN (
+                        SELECT key FROM query_embeddings ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,)).rowcount
+                db.commit()
+            except sqlite3.Error as e:
+                self._errors += 1
+                print(f"[query-embed-cache] Prune error: {e}")
+                return 0
+            self._evictions += removed
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            total = hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "hits": hits,
+                "memoryHits": self._memory_hits,
+                "diskHits": self._disk_hits,
+                "misses": self._misses,
+                "hitRate": round(hits / total, 4) if total else 0.0,
+                "memoryEntries": len(self._memory),
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "errors": self._errors
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+def get_query_embedding_cache_stats() -> Dict[str, Any]:
+    return query_embedding_cache.stats()
@@ -9,9 +9,15 @@ Provides advanced AI capabilities for document verification including:
 
 import os
 import json
+import time
 import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Any, Optional, TypedDict, Annotated
+from typing import List, Dict, Any, Optional, Tuple, TypedDict, Annotated
 from operator import add
 
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
@@ -21,10 +27,24 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_chroma import Chroma
 
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+
+from openai_limiter import openai_limiter, embedding_limiter, estimate_tokens
+from query_embedding_cache import query_embedding_cache, normalize_query
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+RAG_EMBED_CHUNK_SIZE = int(os.environ.get("RAG_EMBED_CHUNK_SIZE", 100))
+RAG_EMBED_CONCURRENCY = int(os.environ.get("RAG_EMBED_CONCURRENCY", 4))
+RAG_EMBED_WRITE_BATCH = int(os.environ.get("RAG_EMBED_WRITE_BATCH", 1000))
+# The embeddings endpoint accepts at most 2048 inputs per request
+RAG_EMBED_MAX_CHUNK_SIZE = 2048
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Stored with every embedded document; bump to force a full re-embed (e.g. new model or text layout)
+EMBEDDING_VERSION = f"{EMBEDDING_MODEL}:v1"
+
 embeddings = None
 llm = None
 vector_store = None
@@ -39,13 +59,15 @@ def init_langchain():
     
     try:
         embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
+            model=EMBEDDING_MODEL,
+            max_retries=0,
             openai_api_key=OPENAI_API_KEY
         )
         
         llm = ChatOpenAI(
             model="gpt-4o",
             temperature=0.3,
+            max_retries=0,
             openai_api_key=OPENAI_API_KEY
         )
         
@@ -74,22 +96,16 @@ class VerificationState(TypedDict):
     ocr_data: Dict[str, Any]
     risk_score: int
     risk_level: str
-    fraud_indicators: List[str]
+    fraud_indicators: Annotated[List[str], add]
     similar_documents: List[Dict]
     compliance_check: Dict[str, Any]
     final_recommendation: str
     workflow_steps: Annotated[List[str], add]
 
 
-def create_document_embedding(verification: Dict) -> Optional[str]:
-    """Create and store embedding for a verification document"""
-    global vector_store
-    
-    if not vector_store or not embeddings:
-        return None
-    
-    try:
-        doc_text = f"""
+def build_verification_document(verification: Dict) -> Document:
+    """Text and metadata that represent a verification in the vector store"""
+    doc_text = f"""
         Document Type: {verification.get('documentType', 'unknown')}
         Customer Name: {verification.get('customerName', 'unknown')}
         Risk Score: {verification.get('riskScore', 0)}
@@ -105,22 +121,86 @@ def create_document_embedding(verification: Dict) -> Optional[str]:
         Validation Results:
         {json.dumps(verification.get('validationResults', []), indent=2)}
         """
-        
-        metadata = {
-            "verification_id": verification.get("id", ""),
-            "document_type": verification.get("documentType", ""),
-            "customer_name": verification.get("customerName", ""),
-            "risk_score": verification.get("riskScore", 0),
-            "risk_level": verification.get("riskLevel", ""),
-            "status": verification.get("status", ""),
-            "submitted_at": verification.get("submittedAt", ""),
-            "type": "verification"
-        }
-        
-        doc = Document(page_content=doc_text, metadata=metadata)
-        
-        doc_id = f"ver_{verification.get('id', str(uuid.uuid4()))}"
-        vector_store.add_documents([doc], ids=[doc_id])
+    
+    metadata = {
+        "verification_id": verification.get("id", ""),
+        "document_type": verification.get("documentType", ""),
+        "customer_name": verification.get("customerName", ""),
+        "risk_score": verification.get("riskScore", 0),
+        "risk_level": verification.get("riskLevel", ""),
+        "status": verification.get("status", ""),
+        "submitted_at": verification.get("submittedAt", ""),
+        "type": "verification"
+    }
+    
+    return Document(page_content=doc_text, metadata=metadata)
+
+
+def verification_document_id(verification: Dict) -> str:
+    return f"ver_{verification.get('id', str(uuid.uuid4()))}"
+
+
+def content_hash(doc: Document) -> str:
+    """Hash of everything written for a document, so any change to its text or metadata re-embeds it"""
+    payload = doc.page_content + "\n" + json.dumps(doc.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stamp_document(doc: Document, digest: str) -> Document:
+    """Copy of `doc` carrying the tracking metadata stored alongside its vector"""
+    metadata = dict(doc.metadata, content_hash=digest, embedding_version=EMBEDDING_VERSION,
+                    embedded_at=datetime.now().isoformat())
+    return Document(page_content=doc.page_content, metadata=metadata)
+
+
+def load_embedded_hashes(ids: List[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """(content_hash, embedding_version) already stored in Chroma for each of `ids` that exists"""
+    stored = {}
+    for offset in range(0, len(ids), RAG_EMBED_WRITE_BATCH):
+        result = vector_store._collection.get(ids=ids[offset:offset + RAG_EMBED_WRITE_BATCH], include=["metadatas"])
+        for doc_id, metadata in zip(result["ids"], result["metadatas"]):
+            metadata = metadata or {}
+            stored[doc_id] = (metadata.get("content_hash"), metadata.get("embedding_version"))
+    return stored
+
+
+def select_stale_documents(ids: List[str], docs: List[Document], force: bool = False) -> Tuple[List[int], Dict[str, int]]:
+    """Indexes of documents that are new or whose content/version changed, plus counts by reason"""
+    hashes = [content_hash(doc) for doc in docs]
+    try:
+        stored = {} if force else load_embedded_hashes(ids)
+    except Exception as e:
+        print(f"[RAG] Could not read embedding hashes, re-embedding everything: {e}")
+        stored = {}
+    
+    stale, counts = [], {"new": 0, "changed": 0, "unchanged": 0}
+    for index, (doc_id, digest) in enumerate(zip(ids, hashes)):
+        if doc_id not in stored:
+            reason = "new"
+        elif force or stored[doc_id] != (digest, EMBEDDING_VERSION):
+            reason = "changed"
+        else:
+            counts["unchanged"] += 1
+            continue
+        counts[reason] += 1
+        stale.append(index)
+    return stale, counts
+
+
+def create_document_embedding(verification: Dict, force: bool = False) -> Optional[str]:
+    """Create and store embedding for a verification document, skipping it if unchanged"""
+    global vector_store
+    
+    if not vector_store or not embeddings:
+        return None
+    
+    try:
+        doc = build_verification_document(verification)
+        doc_id = verification_document_id(verification)
+        stale, _ = select_stale_documents([doc_id], [doc], force)
+        if stale:
+            docs = [stamp_document(doc, content_hash(doc))]
+            _write_embeddings([doc_id], docs, _embed_chunk(docs))
         
         return doc_id
     except Exception as e:
@@ -128,19 +208,132 @@ def create_document_embedding(verification: Dict) -> Optional[str]:
         return None
 
 
-def store_fraud_pattern_embeddings(patterns: List[Dict]) -> int:
-    """Store fraud pattern embeddings for similarity matching"""
-    global vector_store
+def _embed_chunk(docs: List[Document]) -> List[List[float]]:
+    """One embeddings request for a chunk of documents"""
+    texts = [doc.page_content for doc in docs]
+    return embedding_limiter.call(
+        lambda: embeddings.embed_documents(texts, chunk_size=len(texts)),
+        estimated_tokens=estimate_tokens(sum(len(text) for text in texts), 0)
+    )
+
+
+def _write_embeddings(ids: List[str], docs: List[Document], vectors: List[List[float]]):
+    """Upsert precomputed embeddings so re-running a backfill overwrites instead of duplicating"""
+    vector_store._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[doc.page_content for doc in docs],
+        metadatas=[doc.metadata for doc in docs]
+    )
+
+
+def embed_verifications_bulk(verifications: List[Dict], chunk_size: int = RAG_EMBED_CHUNK_SIZE,
+                             concurrency: int = RAG_EMBED_CONCURRENCY, force: bool = False,
+                             dry_run: bool = False) -> Dict[str, Any]:
+    """Embed the new or changed verifications with one embeddings request per chunk.
+    
+    Verifications whose document text, metadata and EMBEDDING_VERSION match
+    what is stored in Chroma are skipped unless `force` is set; `dry_run`
+    only reports how many would be embedded. Chunks are embedded in parallel
+    (at most `concurrency` in flight) and the vectors are written to Chroma
+    in batches of RAG_EMBED_WRITE_BATCH from the calling thread. A failed
+    chunk is reported, not retried, and does not stop the others.
+    """
+    if not vector_store or not embeddings:
+        raise RuntimeError("RAG vector store is not initialized")
     
-    if not vector_store:
-        return 0
+    start = time.perf_counter()
+    chunk_size = max(int(chunk_size), 1)
+    concurrency = max(int(concurrency), 1)
     
-    try:
-        docs = []
-        ids = []
+    all_docs = [build_verification_document(v) for v in verifications]
+    stale, counts = select_stale_documents([verification_document_id(v) for v in verifications], all_docs, force)
+    if dry_run:
+        return {
+            "dryRun": True,
+            "verificationsToEmbed": len(stale),
+            "verificationsUnchanged": counts["unchanged"],
+            "new": counts["new"],
+            "changed": counts["changed"],
+            "chunks": (len(stale) + chunk_size - 1) // chunk_size,
+            "durationMs": round((time.perf_counter() - start) * 1000, 1)
+        }
+    
+    verifications = [verifications[i] for i in stale]
+    stale_docs = [all_docs[i] for i in stale]
+    chunks = [verifications[i:i + chunk_size] for i in range(0, len(verifications), chunk_size)]
+    chunk_docs = [stale_docs[i:i + chunk_size] for i in range(0, len(stale_docs), chunk_size)]
+    failures = []
+    embedded = 0
+    pending_ids, pending_docs, pending_vectors, pending_chunks = [], [], [], []
+    
+    def failure(index: int, stage: str, error: Exception) -> Dict[str, Any]:
+        chunk = chunks[index]
+        return {
+            "chunk": index,
+            "stage": stage,
+            "size": len(chunk),
+            "verificationIds": [v.get("id") for v in chunk],
+            "error": str(error)
+        }
+    
+    def flush():
+        nonlocal embedded
+        if not pending_ids:
+            return
+        try:
+            _write_embeddings(pending_ids, pending_docs, pending_vectors)
+            embedded += len(pending_ids)
+        except Exception as e:
+            print(f"[RAG] Embedding write error: {e}")
+            failures.extend(failure(index, "write", e) for index in pending_chunks)
+        pending_ids.clear()
+        pending_docs.clear()
+        pending_vectors.clear()
+        pending_chunks.clear()
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+        for index, docs in enumerate(chunk_docs):
+            futures[pool.submit(_embed_chunk, docs)] = (index, docs)
         
-        for pattern in patterns:
-            doc_text = f"""
+        for future in as_completed(futures):
+            index, docs = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                print(f"[RAG] Embedding chunk {index} failed: {e}")
+                failures.append(failure(index, "embed", e))
+                continue
+            pending_ids.extend(verification_document_id(v) for v in chunks[index])
+            pending_docs.extend(stamp_document(doc, content_hash(doc)) for doc in docs)
+            pending_vectors.extend(vectors)
+            pending_chunks.append(index)
+            if len(pending_ids) >= RAG_EMBED_WRITE_BATCH:
+                flush()
+        flush()
+    
+    duration = time.perf_counter() - start
+    failures.sort(key=lambda f: f["chunk"])
+    return {
+        "dryRun": False,
+        "verificationsEmbedded": embedded,
+        "verificationsUnchanged": counts["unchanged"],
+        "new": counts["new"],
+        "changed": counts["changed"],
+        "verificationsFailed": sum(f["size"] for f in failures),
+        "chunks": len(chunks),
+        "failedChunks": len(failures),
+        "chunkSize": chunk_size,
+        "concurrency": concurrency,
+        "durationMs": round(duration * 1000, 1),
+        "documentsPerSecond": round(embedded / duration, 2) if duration else 0.0,
+        "failures": failures
+    }
+
+
+def build_fraud_pattern_document(pattern: Dict) -> Document:
+    doc_text = f"""
             Fraud Pattern: {pattern.get('name', '')}
             Description: {pattern.get('description', '')}
             Technique: {pattern.get('technique', '')}
@@ -149,25 +342,111 @@ def store_fraud_pattern_embeddings(patterns: List[Dict]) -> int:
             Detection Method: This pattern is used to identify {pattern.get('name', '').lower()} 
             in identity documents through {pattern.get('technique', '').lower()}.
             """
-            
-            metadata = {
-                "pattern_id": pattern.get("id", ""),
-                "name": pattern.get("name", ""),
-                "technique": pattern.get("technique", ""),
-                "confidence_score": pattern.get("confidenceScore", 0),
-                "type": "fraud_pattern"
-            }
-            
-            docs.append(Document(page_content=doc_text, metadata=metadata))
-            ids.append(f"pattern_{pattern.get('id', str(uuid.uuid4()))}")
+    
+    metadata = {
+        "pattern_id": pattern.get("id", ""),
+        "name": pattern.get("name", ""),
+        "technique": pattern.get("technique", ""),
+        "confidence_score": pattern.get("confidenceScore", 0),
+        "type": "fraud_pattern"
+    }
+    
+    return Document(page_content=doc_text, metadata=metadata)
+
+
+def store_fraud_pattern_embeddings(patterns: List[Dict], force: bool = False, dry_run: bool = False) -> int:
+    """Store embeddings for new or changed fraud patterns; returns how many were (or would be) embedded"""
+    global vector_store
+    
+    if not vector_store:
+        return 0
+    
+    try:
+        docs = [build_fraud_pattern_document(pattern) for pattern in patterns]
+        ids = [f"pattern_{pattern.get('id', str(uuid.uuid4()))}" for pattern in patterns]
         
-        vector_store.add_documents(docs, ids=ids)
-        return len(docs)
+        stale, _ = select_stale_documents(ids, docs, force)
+        if stale and not dry_run:
+            vector_store.add_documents(
+                [stamp_document(docs[i], content_hash(docs[i])) for i in stale],
+                ids=[ids[i] for i in stale]
+            )
+        return len(stale)
     except Exception as e:
         print(f"[RAG] Pattern embedding error: {e}")
         return 0
 
 
+class RetrievalContext:
+    """Vector searches made while analyzing one verification, each run at most once.
+    
+    The workflow nodes and analyze_document_with_rag ask for the same
+    retrievals; inside a retrieval_scope they share the results. Concurrent
+    requests for the same search wait for the first one instead of repeating it.
+    """
+    
+    def __init__(self, verification: Optional[Dict] = None):
+        self.verification = verification
+        self.searches = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple, List[Dict]] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+    
+    def search(self, key: Tuple, run) -> List[Dict]:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._results:
+                    self.reused += 1
+                    return self._results[key]
+            results = run()
+            with self._lock:
+                self._results[key] = results
+                self.searches += 1
+            return results
+    
+    def stats(self) -> Dict[str, int]:
+        return {"searches": self.searches, "reused": self.reused}
+
+
+_retrieval_context: ContextVar[Optional[RetrievalContext]] = ContextVar("retrieval_context", default=None)
+
+
+@contextmanager
+def retrieval_scope(verification: Optional[Dict] = None):
+    """Share retrievals until the block exits; reuses an enclosing scope if there is one"""
+    current = _retrieval_context.get()
+    if current is not None:
+        yield current
+        return
+    context = RetrievalContext(verification)
+    token = _retrieval_context.set(context)
+    try:
+        yield context
+    finally:
+        _retrieval_context.reset(token)
+
+
+def workflow_verification(state: "VerificationState", fallback: Dict) -> Dict:
+    """The full verification being analyzed when the scope has it, else the partial one built from state"""
+    context = _retrieval_context.get()
+    if context and context.verification and context.verification.get("id", "") == state.get("verification_id"):
+        return context.verification
+    return fallback
+
+
+def embed_query_cached(query: str) -> List[float]:
+    """Embedding for a retrieval query, from the query cache when the same text was seen before"""
+    return query_embedding_cache.get_or_compute(
+        query,
+        EMBEDDING_MODEL,
+        lambda text: embedding_limiter.call(lambda: embeddings.embed_query(text),
+                                            estimated_tokens=estimate_tokens(len(text), 0))
+    )
+
+
 def semantic_document_search(query: str, k: int = 5, filter_type: str = None) -> List[Dict]:
     """Search for similar documents using semantic similarity"""
     global vector_store
@@ -175,13 +454,22 @@ def semantic_document_search(query: str, k: int = 5, filter_type: str = None) ->
     if not vector_store:
         return []
     
+    context = _retrieval_context.get()
+    if context is not None:
+        return context.search((normalize_query(query), k, filter_type),
+                              lambda: _semantic_document_search(query, k, filter_type))
+    return _semantic_document_search(query, k, filter_type)
+
+
+def _semantic_document_search(query: str, k: int, filter_type: Optional[str]) -> List[Dict]:
     try:
         filter_dict = None
         if filter_type:
             filter_dict = {"type": filter_type}
         
-        results = vector_store.similarity_search_with_score(
-            query, 
+        query_embedding = embed_query_cached(query)
+        results = vector_store.similarity_search_by_vector_with_relevance_scores(
+            query_embedding,
             k=k,
             filter=filter_dict
         )
@@ -285,7 +573,9 @@ Be concise but thorough. Cite similar cases or patterns when relevant."""
         
         messages.append(HumanMessage(content=user_message))
         
-        response = llm.invoke(messages)
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        response = openai_limiter.call(lambda: llm.invoke(messages),
+                                       estimated_tokens=estimate_tokens(prompt_chars, 1000))
         return response.content
         
     except Exception as e:
@@ -293,33 +583,39 @@ Be concise but thorough. Cite similar cases or patterns when relevant."""
         return f"I encountered an error processing your request. Based on the document's risk score of {verification.get('riskScore', 0)}, this is classified as {verification.get('riskLevel', 'unknown')} risk."
 
 
-def ocr_analysis_node(state: VerificationState) -> VerificationState:
+def timed_node(step: str, node):
+    """Wrap a node so its workflow step reports how long the node took"""
+    def run(state: VerificationState) -> Dict[str, Any]:
+        started = time.perf_counter()
+        update = node(state)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return {**update, "workflow_steps": [f"{step} ({elapsed_ms:.0f} ms)"]}
+    return run
+
+
+def ocr_analysis_node(state: VerificationState) -> Dict[str, Any]:
     """LangGraph node: Analyze OCR data quality"""
-    state["workflow_steps"] = ["OCR Analysis: Checking extracted field quality"]
-    
     ocr_data = state.get("ocr_data", {})
     fields = ocr_data.get("extracted_fields", [])
     
     low_confidence_fields = [f for f in fields if f.get("confidence", 100) < 80]
     
     if low_confidence_fields:
-        state["fraud_indicators"] = state.get("fraud_indicators", []) + [
+        return {"fraud_indicators": [
             f"Low OCR confidence on: {', '.join([f.get('fieldName', 'unknown') for f in low_confidence_fields])}"
-        ]
+        ]}
     
-    return state
+    return {}
 
 
-def fraud_detection_node(state: VerificationState) -> VerificationState:
+def fraud_detection_node(state: VerificationState) -> Dict[str, Any]:
     """LangGraph node: Check for fraud patterns using vector similarity"""
-    state["workflow_steps"] = ["Fraud Detection: Matching against known patterns"]
-    
-    verification = {
+    verification = workflow_verification(state, {
         "documentType": state.get("document_type", ""),
         "riskScore": state.get("risk_score", 0),
         "riskInsights": [],
         "ocrFields": state.get("ocr_data", {}).get("extracted_fields", [])
-    }
+    })
     
     matching_patterns = find_matching_fraud_patterns(verification, k=3)
     
@@ -328,47 +624,41 @@ def fraud_detection_node(state: VerificationState) -> VerificationState:
         if p.get("similarity_score", 0) > 0.7
     ]
     
-    if high_confidence_matches:
-        for pattern in high_confidence_matches:
-            state["fraud_indicators"] = state.get("fraud_indicators", []) + [
-                f"Potential {pattern['metadata'].get('name', 'fraud')} detected (similarity: {pattern['similarity_score']:.0%})"
-            ]
-    
-    return state
+    return {"fraud_indicators": [
+        f"Potential {pattern['metadata'].get('name', 'fraud')} detected (similarity: {pattern['similarity_score']:.0%})"
+        for pattern in high_confidence_matches
+    ]}
 
 
-def similar_docs_node(state: VerificationState) -> VerificationState:
+def similar_docs_node(state: VerificationState) -> Dict[str, Any]:
     """LangGraph node: Find similar past verifications"""
-    state["workflow_steps"] = ["Historical Analysis: Searching similar documents"]
-    
-    verification = {
+    verification = workflow_verification(state, {
         "documentType": state.get("document_type", ""),
         "customerName": "",
         "riskInsights": []
-    }
+    })
     
     similar = find_similar_verifications(verification, k=3)
-    state["similar_documents"] = similar
+    update = {"similar_documents": similar}
     
     high_risk_similar = [d for d in similar if d["metadata"].get("risk_level") == "high"]
     if high_risk_similar:
-        state["fraud_indicators"] = state.get("fraud_indicators", []) + [
+        update["fraud_indicators"] = [
             f"Similar to {len(high_risk_similar)} high-risk document(s)"
         ]
     
-    return state
+    return update
 
 
-def compliance_check_node(state: VerificationState) -> VerificationState:
+def compliance_check_node(state: VerificationState) -> Dict[str, Any]:
     """LangGraph node: Run compliance checks"""
-    state["workflow_steps"] = ["Compliance Check: Validating regulatory requirements"]
-    
     checks = {
         "document_type_valid": state.get("document_type") in ["passport", "drivers_license", "national_id"],
         "has_required_fields": True,
         "expiry_valid": True,
         "issuing_authority_valid": True
     }
+    update = {"compliance_check": checks}
     
     ocr_data = state.get("ocr_data", {})
     fields = ocr_data.get("extracted_fields", [])
@@ -380,18 +670,15 @@ def compliance_check_node(state: VerificationState) -> VerificationState:
     if missing_fields:
         checks["has_required_fields"] = False
         checks["missing_fields"] = missing_fields
-        state["fraud_indicators"] = state.get("fraud_indicators", []) + [
+        update["fraud_indicators"] = [
             f"Missing required fields: {', '.join(missing_fields)}"
         ]
     
-    state["compliance_check"] = checks
-    return state
+    return update
 
 
-def recommendation_node(state: VerificationState) -> VerificationState:
+def recommendation_node(state: VerificationState) -> Dict[str, Any]:
     """LangGraph node: Generate final recommendation"""
-    state["workflow_steps"] = ["Final Analysis: Generating recommendation"]
-    
     fraud_indicators = state.get("fraud_indicators", [])
     risk_score = state.get("risk_score", 50)
     compliance = state.get("compliance_check", {})
@@ -403,25 +690,31 @@ def recommendation_node(state: VerificationState) -> VerificationState:
     else:
         recommendation = f"MANUAL REVIEW - Medium risk ({risk_score}/100) with {len(fraud_indicators)} indicator(s) requiring analyst attention"
     
-    state["final_recommendation"] = recommendation
-    return state
+    return {"final_recommendation": recommendation}
+
+
+# The four analysis nodes only read the initial state, so they run as parallel
+# branches; recommendation waits for all of them. Nodes return partial updates:
+# fraud_indicators and workflow_steps are merged by their reducers.
+ANALYSIS_NODES = [
+    ("ocr_analysis", "OCR Analysis: Checking extracted field quality", ocr_analysis_node),
+    ("fraud_detection", "Fraud Detection: Matching against known patterns", fraud_detection_node),
+    ("similar_docs", "Historical Analysis: Searching similar documents", similar_docs_node),
+    ("compliance", "Compliance Check: Validating regulatory requirements", compliance_check_node),
+]
 
 
 def create_verification_workflow() -> StateGraph:
     """Create the LangGraph verification workflow"""
     workflow = StateGraph(VerificationState)
     
-    workflow.add_node("ocr_analysis", ocr_analysis_node)
-    workflow.add_node("fraud_detection", fraud_detection_node)
-    workflow.add_node("similar_docs", similar_docs_node)
-    workflow.add_node("compliance_check", compliance_check_node)
-    workflow.add_node("recommendation", recommendation_node)
-    
-    workflow.set_entry_point("ocr_analysis")
-    workflow.add_edge("ocr_analysis", "fraud_detection")
-    workflow.add_edge("fraud_detection", "similar_docs")
-    workflow.add_edge("similar_docs", "compliance_check")
-    workflow.add_edge("compliance_check", "recommendation")
+    for name, step, node in ANALYSIS_NODES:
+        workflow.add_node(name, timed_node(step, node))
+        workflow.add_edge(START, name)
+    workflow.add_node("recommendation",
+                      timed_node("Final Analysis: Generating recommendation", recommendation_node))
+    
+    workflow.add_edge([name for name, _, _ in ANALYSIS_NODES], "recommendation")
     workflow.add_edge("recommendation", END)
     
     return workflow.compile()
@@ -460,7 +753,8 @@ def run_verification_workflow(verification: Dict, ocr_result: Dict) -> Dict:
             workflow_steps=[]
         )
         
-        final_state = verification_workflow.invoke(initial_state)
+        with retrieval_scope(verification):
+            final_state = verification_workflow.invoke(initial_state)
         
         return {
             "workflow_steps": final_state.get("workflow_steps", []),
@@ -505,14 +799,17 @@ def analyze_document_with_rag(verification: Dict, ocr_result: Dict) -> Dict:
     
     create_document_embedding(verification)
     
-    workflow_result = run_verification_workflow(verification, ocr_result)
-    
-    similar_docs = find_similar_verifications(verification, k=3)
-    matching_patterns = find_matching_fraud_patterns(verification, k=3)
+    # The workflow nodes run the same retrievals; share them instead of repeating them
+    with retrieval_scope(verification) as retrieval:
+        workflow_result = run_verification_workflow(verification, ocr_result)
+        
+        similar_docs = find_similar_verifications(verification, k=3)
+        matching_patterns = find_matching_fraud_patterns(verification, k=3)
     
     return {
         "workflow_analysis": workflow_result,
         "similar_verifications": similar_docs,
         "matching_fraud_patterns": matching_patterns,
+        "retrieval_stats": retrieval.stats(),
         "knowledge_base_stats": get_knowledge_base_stats()
     }
@@ -0,0 +1,115 @@
+"""
+Rescore Module - Bulk re-evaluation of pending verifications
+When the approval thresholds change, every pending verification is
+re-decided in a single pass instead of one row at a time:
+- Scoring inputs loaded column-wise from a server-side cursor into NumPy arrays
+- New statuses computed vectorized over the whole set
+- Changed rows written back with one UPDATE ... FROM (VALUES ...) per chunk
+- One summary audit event per run
+"""
+
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+from db import borrow_connection
+from audit_writer import enqueue_audit_event
+
+RESCORE_CHUNK_SIZE = int(os.environ.get("RESCORE_CHUNK_SIZE", 5000))
+RESCORE_FETCH_SIZE = 20000
+
+# Settings keys that change how a pending verification is decided
+RESCORE_SETTING_KEYS = ("autoApproveThreshold", "highRiskThreshold", "autoRejectHighRisk")
+
+_run_lock = threading.Lock()
+
+
+def load_pending_scores(conn) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (ids, risk_scores) for every pending verification as parallel arrays"""
+    cur = conn.cursor(name=f"rescore_{uuid.uuid4().hex}", cursor_factory=psycopg2.extensions.cursor)
+    cur.itersize = RESCORE_FETCH_SIZE
+    cur.execute("SELECT id, risk_score FROM verifications WHERE status = 'pending'")
+
+    id_chunks, score_chunks = [], []
+    while True:
+        rows = cur.fetchmany(RESCORE_FETCH_SIZE)
+        if not rows:
+            break
+        ids, scores = zip(*rows)
+        id_chunks.append(np.array(ids, dtype=object))
+        score_chunks.append(np.array([s if s is not None else np.nan for s in scores], dtype=np.float64))
+    cur.close()
+
+    if not id_chunks:
+        return np.empty(0, dtype=object), np.empty(0, dtype=np.float64)
+    return np.concatenate(id_chunks), np.concatenate(score_chunks)
+
+
+def decide_statuses(scores: np.ndarray, settings: Dict[str, Any]) -> np.ndarray:
+    """Vectorized equivalent of the per-verification approve/reject decision"""
+    approve = scores < settings["autoApproveThreshold"]
+    reject = bool(settings["autoRejectHighRisk"]) & (scores > settings["highRiskThreshold"])
+    statuses = np.where(approve, "approved", np.where(reject, "rejected", "pending"))
+    # Rows without a score cannot be decided automatically
+    return np.where(np.isnan(scores), "pending", statuses)
+
+
+def rescore_pending_verifications(settings: Dict[str, Any], reason: str = "settings_updated",
+                                  ip_address: Optional[str] = None) -> Dict[str, Any]:
+    """Re-decide every pending verification against `settings` and write back the changes"""
+    with _run_lock:
+        start = time.perf_counter()
+        conn = borrow_connection()
+        try:
+            ids, scores = load_pending_scores(conn)
+            statuses = decide_statuses(scores, settings)
+            changed = np.flatnonzero(statuses != "pending")
+
+            reviewed_at = datetime.now()
+            updated = 0
+            cur = conn.cursor()
+            for offset in range(0, len(changed), RESCORE_CHUNK_SIZE):
+                chunk = changed[offset:offset + RESCORE_CHUNK_SIZE]
+                # The status guard leaves alone anything reviewed by hand since it was loaded
+                execute_values(cur, """
+                    UPDATE verifications AS v
+                    SET status = d.status, reviewed_at = d.reviewed_at
+                    FROM (VALUES %s) AS d (id, status, reviewed_at)
+                    WHERE v.id = d.id AND v.status = 'pending'
+                """, [(ids[i], statuses[i], reviewed_at) for i in chunk], page_size=len(chunk))
+                updated += cur.rowcount
+                conn.commit()
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        summary = {
+            "reason": reason,
+            "pendingChecked": int(len(ids)),
+            "approved": int(np.count_nonzero(statuses == "approved")),
+            "rejected": int(np.count_nonzero(statuses == "rejected")),
+            "updated": int(updated),
+            "thresholds": {key: settings.get(key) for key in RESCORE_SETTING_KEYS},
+            "durationMs": round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    enqueue_audit_event(
+        action="verifications_rescored",
+        entity_type="verification",
+        details=summary,
+        ip_address=ip_address
+    )
+    print(f"[rescore] {summary['updated']} of {summary['pendingChecked']} pending verifications re-decided "
+          f"in {summary['durationMs']} ms")
+    return summary
@@ -0,0 +1,139 @@
+"""
+Settings Cache Module - In-process settings cache with cross-process invalidation
+Settings rows carry a version that every write bumps and publishes with
+Postgres NOTIFY. Each process keeps one LISTEN connection open on a
+background thread:
+- Reads are served from memory while the listener is connected
+- A notification for a newer version drops the cached copy immediately
+- If the listener is down, reads fall through to the database
+"""
+
+import time
+import select
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from db import open_dedicated_connection
+
+SETTINGS_CHANNEL = "settings_changed"
+
+
+class SettingsCache:
+    """Version-stamped cache invalidated by Postgres LISTEN/NOTIFY"""
+
+    def __init__(self, loader: Callable[[], Tuple[Dict[str, Any], int]], channel: str = SETTINGS_CHANNEL):
+        self._loader = loader
+        self.channel = channel
+
+        self._lock = threading.Lock()
+        self._value: Optional[Dict[str, Any]] = None
+        self._version: Optional[int] = None
+        self._latest_seen = 0
+        self._listening = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._reconnects = 0
+
+    def _ensure_listener(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen_loop, name="settings-listener", daemon=True)
+            self._thread.start()
+
+    def _listen_loop(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = open_dedicated_connection()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.channel}")
+                # Anything cached before LISTEN took effect may have missed a notification
+                self.invalidate()
+                self._listening.set()
+                backoff = 1.0
+
+                while True:
+                    ready, _, _ = select.select([conn], [], [], 60)
+                    if not ready:
+                        cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self.invalidate(int(notify.payload))
+                        except ValueError:
+                            self.invalidate()
+            except Exception as e:
+                self._listening.clear()
+                self.invalidate()
+                self._reconnects += 1
+                print(f"[settings] Listener disconnected, retrying in {backoff:.0f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def get(self) -> Dict[str, Any]:
+        """Return the current settings, from memory when the cache is trustworthy"""
+        self._ensure_listener()
+
+        with self._lock:
+            if self._listening.is_set() and self._value is not None:
+                self._hits += 1
+                return dict(self._value)
+            self._misses += 1
+
+        value, version = self._loader()
+        self.set(value, version)
+        return dict(value)
+
+    def set(self, value: Dict[str, Any], version: int):
+        """Cache a value unless a newer version has already been announced"""
+        with self._lock:
+            if not self._listening.is_set():
+                return
+            if version < self._latest_seen:
+                return
+            if self._version is not None and self._value is not None and version < self._version:
+                return
+            self._value = dict(value)
+            self._version = version
+            self._latest_seen = max(self._latest_seen, version)
+
+    def invalidate(self, version: Optional[int] = None):
+        """Drop the cached copy if `version` is newer (or unconditionally when None)"""
+        with self._lock:
+            if version is not None:
+                self._latest_seen = max(self._latest_seen, version)
+                if self._version is not None and version <= self._version:
+                    return
+            if self._value is not None:
+                self._invalidations += 1
+            self._value = None
+            self._version = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "listening": self._listening.is_set(),
+            "version": self._version,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hitRate": round(self._hits / total, 4) if total else 0.0,
+            "invalidations": self._invalidations,
+            "listenerReconnects": self._reconnects
+        }
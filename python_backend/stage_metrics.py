@@ -0,0 +1,114 @@
+"""
+Stage Metrics Module - Latency histograms for multi-stage request paths
+Each named stage gets a fixed-bucket histogram of wall times:
+- Cheap to record from many threads (one lock, one bucket increment)
+- Quantiles estimated from bucket bounds, so memory does not grow with traffic
+- StageTimer context manager that records a stage and keeps a per-run breakdown
+"""
+
+import time
+import bisect
+import threading
+from typing import Any, Dict, List, Optional
+
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets = list(buckets or LATENCY_BUCKETS_MS)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, ms: float):
+        index = bisect.bisect_left(self.buckets, ms)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += ms
+            self._max = max(self._max, ms)
+
+    def _quantile(self, q: float) -> float:
+        if not self._count:
+            return 0.0
+        rank = q * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return float(self.buckets[index]) if index < len(self.buckets) else self._max
+        return self._max
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self._count,
+                "avgMs": round(self._sum / self._count, 2) if self._count else 0.0,
+                "maxMs": round(self._max, 2),
+                "p50Ms": self._quantile(0.5),
+                "p95Ms": self._quantile(0.95),
+                "p99Ms": self._quantile(0.99),
+                "buckets": {
+                    (f"le{bound}" if i < len(self.buckets) else "inf"): count
+                    for i, (bound, count) in enumerate(zip(self.buckets + [None], self._counts))
+                }
+            }
+
+
+class StageMetrics:
+    """A set of per-stage histograms for one pipeline"""
+
+    def __init__(self, stages: List[str]):
+        self.stages = list(stages)
+        self._histograms = {stage: LatencyHistogram() for stage in self.stages}
+
+    def observe(self, stage: str, ms: float):
+        self._histograms[stage].observe(ms)
+
+    def timer(self) -> "StageTimer":
+        return StageTimer(self)
+
+    def stats(self) -> Dict[str, Any]:
+        return {stage: self._histograms[stage].stats() for stage in self.stages}
+
+
+class StageTimer:
+    """Times the stages of one run, feeding the shared histograms as it goes"""
+
+    def __init__(self, metrics: StageMetrics):
+        self._metrics = metrics
+        self._started = time.perf_counter()
+        self.breakdown: Dict[str, float] = {}
+
+    def stage(self, name: str) -> "_StageContext":
+        return _StageContext(self, name)
+
+    def record(self, name: str, ms: float):
+        self.breakdown[f"{name}Ms"] = round(self.breakdown.get(f"{name}Ms", 0.0) + ms, 2)
+        self._metrics.observe(name, ms)
+
+    def finish(self) -> Dict[str, float]:
+        """Record the total and return the full breakdown"""
+        total_ms = (time.perf_counter() - self._started) * 1000
+        self.record("total", total_ms)
+        return dict(self.breakdown)
+
+
+class _StageContext:
+    def __init__(self, timer: StageTimer, name: str):
+        self._timer = timer
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._timer.record(self._name, (time.perf_counter() - self._start) * 1000)
+        return False
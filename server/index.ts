@@ -10,6 +10,7 @@ const app = express();
 const httpServer = createServer(app);
 
 let pythonProcess: ChildProcess | null = null;
+let batchWorkerProcess: ChildProcess | null = null;
 
 declare module "express-session" {
   interface SessionData {
@@ -71,10 +72,44 @@ function startPythonBackend() {
   console.log("[python] Starting Python backend on port 5001...");
 }
 
+function startBatchWorker() {
+  const workerPath = path.join(process.cwd(), "python_backend", "batch_worker.py");
+
+  console.log(`[worker] Starting batch worker from: ${workerPath}`);
+
+  batchWorkerProcess = spawn("py", [workerPath], {
+    env: { ...process.env },
+    stdio: ["pipe", "pipe", "pipe"],
+    cwd: process.cwd(),
+  });
+
+  batchWorkerProcess.stdout?.on("data", (data) => {
+    console.log(`[worker] ${data.toString().trim()}`);
+  });
+
+  batchWorkerProcess.stderr?.on("data", (data) => {
+    console.log(`[worker] ${data.toString().trim()}`);
+  });
+
+  batchWorkerProcess.on("error", (err) => {
+    console.error(`[worker] Failed to start batch worker: ${err.message}`);
+  });
+
+  batchWorkerProcess.on("exit", (code) => {
+    if (code !== null && code !== 0) {
+      console.log(`[worker] Batch worker exited with code ${code}, restarting...`);
+      setTimeout(startBatchWorker, 2000);
+    }
+  });
+}
+
 process.on("SIGTERM", () => {
   if (pythonProcess) {
     pythonProcess.kill();
   }
+  if (batchWorkerProcess) {
+    batchWorkerProcess.kill();
+  }
   process.exit(0);
 });
 
@@ -82,6 +117,9 @@ process.on("SIGINT", () => {
   if (pythonProcess) {
     pythonProcess.kill();
   }
+  if (batchWorkerProcess) {
+    batchWorkerProcess.kill();
+  }
   process.exit(0);
 });
 
@@ -153,6 +191,7 @@ app.use((req, res, next) => {
 
 (async () => {
   startPythonBackend();
+  startBatchWorker();
   
   // Wait for Python backend to be ready in production
   if (process.env.NODE_ENV === "production") {
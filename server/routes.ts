@@ -1,6 +1,7 @@
 import type { Express, Request, Response } from "express";
 import { type Server } from "http";
 import multer from "multer";
+import { Readable } from "stream";
 
 const upload = multer({ 
   storage: multer.memoryStorage(),
@@ -26,7 +27,7 @@ async function proxyToPython(req: Request, res: Response, options: {
   
   for (let attempt = 0; attempt < maxRetries; attempt++) {
     try {
-      const url = `${PYTHON_BACKEND_URL}${req.path}`;
+      const url = `${PYTHON_BACKEND_URL}${req.originalUrl}`;
       const method = options.method || req.method;
       
       const fetchOptions: RequestInit = {
@@ -69,6 +70,8 @@ export async function registerRoutes(
   
   app.get("/api/health", (req, res) => proxyToPython(req, res));
   
+  app.get("/api/metrics", (req, res) => proxyToPython(req, res));
+  
   app.get("/api/dashboard", (req, res) => proxyToPython(req, res));
   
   app.get("/api/verifications", (req, res) => proxyToPython(req, res));
@@ -110,6 +113,39 @@ export async function registerRoutes(
     res.status(502).json({ error: "Backend service unavailable. Please try again in a moment." });
   });
   
+  app.get("/api/documents/:hash", async (req, res) => {
+    try {
+      const headers: Record<string, string> = {};
+      for (const name of ["range", "if-none-match", "if-modified-since", "if-range"]) {
+        const value = req.headers[name];
+        if (typeof value === "string") {
+          headers[name] = value;
+        }
+      }
+      
+      const response = await fetch(`${PYTHON_BACKEND_URL}${req.path}`, { headers });
+      
+      res.status(response.status);
+      for (const name of ["content-type", "content-length", "content-range", "accept-ranges", "etag", "last-modified", "cache-control"]) {
+        const value = response.headers.get(name);
+        if (value) {
+          res.setHeader(name, value);
+        }
+      }
+      
+      if (!response.body) {
+        res.end();
+        return;
+      }
+      Readable.fromWeb(response.body as any).pipe(res);
+    } catch (error) {
+      console.error("Document stream error:", error);
+      res.status(502).json({ error: "Backend service unavailable" });
+    }
+  });
+  
+  app.post("/api/verifications/rescore", (req, res) => proxyToPython(req, res));
+  
   app.patch("/api/verifications/:id", (req, res) => proxyToPython(req, res));
   
   app.get("/api/verifications/:id/chat", (req, res) => proxyToPython(req, res));
@@ -145,11 +181,15 @@ export async function registerRoutes(
       const url = `${PYTHON_BACKEND_URL}/api/audit-logs/export${queryString ? '?' + queryString : ''}`;
       const response = await fetch(url);
       
-      res.setHeader('Content-Type', 'text/csv');
+      res.status(response.status);
+      res.setHeader('Content-Type', response.headers.get('Content-Type') || 'text/csv');
       res.setHeader('Content-Disposition', response.headers.get('Content-Disposition') || 'attachment; filename="audit_logs.csv"');
       
-      const buffer = await response.arrayBuffer();
-      res.send(Buffer.from(buffer));
+      if (!response.body) {
+        res.end();
+        return;
+      }
+      Readable.fromWeb(response.body as any).pipe(res);
     } catch (error) {
       console.error("Audit export error:", error);
       res.status(502).json({ error: "Backend service unavailable" });
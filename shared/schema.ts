@@ -61,6 +61,9 @@ export const verificationSchema = z.object({
   id: z.string(),
   documentType: DocumentTypeEnum,
   documentUrl: z.string(),
+  documentHash: z.string().nullable().optional(),
+  documentMimeType: z.string().nullable().optional(),
+  processingTimings: z.record(z.number()).nullable().optional(),
   status: VerificationStatusEnum,
   riskScore: z.number().min(0).max(100),
   riskLevel: RiskLevelEnum,